@@ -15,7 +15,9 @@ from PyQt4.QtCore import *
 from PyQt4.QtGui import *
 
 import eranos
+import fileIO
 import vision
+import snapshot
 from material import Material
 from isotope import Isotope
 
@@ -114,10 +116,10 @@ class EPTMainWindow(QMainWindow):
                                  self.menuHelp.menuAction()])
         
         self.actionLoadEranos = QAction("&Load ERANOS Data from Output...",self)
-        self.actionLoadXML = QAction("Load ERANOS Data from XML...",self)
-        self.actionLoadXML.setDisabled(True)
-        self.actionSaveXML = QAction("Save ERANOS Data as XML...", self)
-        self.actionSaveXML.setDisabled(True)
+        self.actionFollowEranos = QAction("&Follow Running ERANOS Output...",self)
+        self.actionLoadSnapshot = QAction("Load ERANOS Data from Snapshot...",self)
+        self.actionSaveSnapshot = QAction("Save ERANOS Data as Snapshot...", self)
+        self.actionSaveSnapshot.setDisabled(True)
         self.actionSaveText = QAction("Save ERANOS Data as text...", self)
         self.actionSaveText.setDisabled(True)
         self.actionWriteVision = QAction("Write VISION Input - Single Stream...", self)
@@ -125,8 +127,9 @@ class EPTMainWindow(QMainWindow):
         self.actionWriteVision2 = QAction("Write VISION Input - Two Streams...", self)
         self.actionWriteVision2.setDisabled(True)
         self.actionExit = QAction("E&xit",self)
-        self.menuFile.addActions([self.actionLoadEranos, self.actionLoadXML,
-                                  self.actionSaveXML, self.actionSaveText,
+        self.menuFile.addActions([self.actionLoadEranos,
+                                  self.actionFollowEranos, self.actionLoadSnapshot,
+                                  self.actionSaveSnapshot, self.actionSaveText,
                                   self.actionWriteVision, self.actionWriteVision2, 
                                   self.actionExit])
         self.menuFile.insertSeparator(self.actionWriteVision)
@@ -139,6 +142,9 @@ class EPTMainWindow(QMainWindow):
 
         # Menu Signals
         self.connect(self.actionLoadEranos, SIGNAL("triggered()"), self.loadEranos)
+        self.connect(self.actionFollowEranos, SIGNAL("triggered()"), self.followEranos)
+        self.connect(self.actionLoadSnapshot, SIGNAL("triggered()"), self.loadSnapshot)
+        self.connect(self.actionSaveSnapshot, SIGNAL("triggered()"), self.saveSnapshot)
         self.connect(self.actionSaveText, SIGNAL("triggered()"), self.saveText)
         self.connect(self.actionWriteVision, SIGNAL("triggered()"), self.writeVision)
         self.connect(self.actionWriteVision2, SIGNAL("triggered()"), self.writeVision2)
@@ -153,6 +159,11 @@ class EPTMainWindow(QMainWindow):
         self.connect(self.timeCombo, SIGNAL("activated(int)"), self.update)
         self.connect(self.matCombo, SIGNAL("activated(int)"), self.update)
 
+        # Timer to poll an ERANOS output that is still being written
+        self.follower = None
+        self.followTimer = QTimer(self)
+        self.connect(self.followTimer, SIGNAL("timeout()"), self.pollEranos)
+
         # Perform initial loading
         self.cycles = []
         self.charge = []
@@ -206,8 +217,9 @@ class EPTMainWindow(QMainWindow):
             pv.setText("{0:10.4e}".format(
                     material.externalDose(True) / material.mass() ))
         if self.propCombo.currentIndex() == 10:
-            if material.criticalMass():
-                pv.setText("{0:10.4e}".format(material.criticalMass()))
+            value = material.criticalMass()
+            if value:
+                pv.setText("{0:10.4e}".format(value))
             else:
                 pv.setText("")
         if self.propCombo.currentIndex() == 11:
@@ -227,13 +239,15 @@ class EPTMainWindow(QMainWindow):
         if self.propCombo.currentIndex() == 16:
             pv.setText("{0:10.4e}".format(material.charlton5()))
         if self.propCombo.currentIndex() == 17:
-            if material.bathke1():
-                pv.setText("{0:10.4e}".format(material.bathke1(False)))
+            value = material.bathke1()
+            if value:
+                pv.setText("{0:10.4e}".format(value))
             else:
                 pv.setText("")
         if self.propCombo.currentIndex() == 18:
-            if material.bathke2():
-                pv.setText("{0:10.4e}".format(material.bathke2(False)))
+            value = material.bathke2()
+            if value:
+                pv.setText("{0:10.4e}".format(value))
             else:
                 pv.setText("")
         if self.propCombo.currentIndex() == 19:
@@ -319,17 +333,121 @@ class EPTMainWindow(QMainWindow):
                 self, "Load ERANOS Data", "./", "ERANOS Data (*.data.*)"))
         if not filename:
             return
-        self.cycles, self.charge, self.discharge, self.chblank, self.disblank, self.onestreamch, self.onestreamdis = eranos.loadData(filename)
+        self.stopFollowing()
+        self.cycles, self.charge, self.discharge, self.chblank, self.disblank, self.onestreamch, self.onestreamdis = eranos.loadData(
+            filename, self, useCache=True, lazy=fileIO.seekable(filename))
         # self.eranosOut = eranos.EranosOutput(filename, self)
         # self.eranosOut.loadData()
         self.cycleCombo.clear()
         self.cycleCombo.addItems([str(i+1) for i in range(len(self.cycles))])
         self.cycleChanged(0)
+        self.actionSaveSnapshot.setEnabled(True)
+        self.actionSaveText.setEnabled(True)
+        self.actionWriteVision.setEnabled(True)
+        self.actionWriteVision2.setEnabled(True)
+        self.actionEditCooling.setEnabled(True)
+
+    def loadSnapshot(self):
+        """
+        Open file dialog to select an ERANOS data snapshot.
+        """
+
+        filename = str(QFileDialog.getOpenFileName(
+                self, "Load ERANOS Snapshot", "./", "ERANOS Snapshot (*.npz)"))
+        if not filename:
+            return
+        self.stopFollowing()
+        self.cycles, self.charge, self.discharge, self.chblank, self.disblank, self.onestreamch, self.onestreamdis = snapshot.loadSnapshot(filename)
+        self.cycleCombo.clear()
+        self.cycleCombo.addItems([str(i+1) for i in range(len(self.cycles))])
+        self.cycleChanged(0)
+        self.actionSaveSnapshot.setEnabled(True)
         self.actionSaveText.setEnabled(True)
         self.actionWriteVision.setEnabled(True)
         self.actionWriteVision2.setEnabled(True)
         self.actionEditCooling.setEnabled(True)
 
+    def saveSnapshot(self):
+        """
+        Write all ERANOS data to a binary snapshot.
+        """
+
+        filename = str(QFileDialog.getSaveFileName(
+                self, "Save ERANOS Snapshot", "./", "ERANOS Snapshot (*.npz)"))
+        if filename:
+            snapshot.saveSnapshot(filename, (self.cycles, self.charge,
+                self.discharge, self.chblank, self.disblank,
+                self.onestreamch, self.onestreamdis))
+
+    def followEranos(self):
+        """
+        Open file dialog to select an ERANOS output that is still being
+        written and add its cycles as they are completed.
+        """
+
+        filename = str(QFileDialog.getOpenFileName(
+                self, "Follow ERANOS Output", "./", "ERANOS Data (*.data.*)"))
+        if not filename:
+            return
+        self.stopFollowing()
+        self.follower = eranos.EranosFollower(
+            filename, lazy=fileIO.seekable(filename))
+        self.clearCycles()
+        self.actionSaveSnapshot.setDisabled(True)
+        self.actionWriteVision.setDisabled(True)
+        self.actionWriteVision2.setDisabled(True)
+        self.pollEranos()
+        self.followTimer.start(5000)
+
+    def pollEranos(self):
+        """
+        Add the cycles completed since the last poll of the followed
+        ERANOS output, and finish loading once the run has ended.
+        """
+
+        if not self.follower:
+            return
+        cycles = self.follower.poll()
+        if self.follower.reset:
+            # The output was truncated and is read again from the start
+            self.clearCycles()
+        if cycles:
+            first = not self.cycles
+            self.cycles += cycles
+            self.cycleCombo.addItems([str(i+1) for i in range(
+                        len(self.cycles) - len(cycles), len(self.cycles))])
+            if first:
+                self.cycleChanged(0)
+            self.actionSaveText.setEnabled(True)
+            self.actionEditCooling.setEnabled(True)
+
+        # The run has ended once the vectors are written and the file
+        # stops growing
+        if self.follower.finished and not self.follower.appended:
+            n = len(self.cycles)
+            self.cycles, self.charge, self.discharge, self.chblank, self.disblank, self.onestreamch, self.onestreamdis = self.follower.finish()
+            self.cycleCombo.addItems([str(i+1) for i in range(
+                        n, len(self.cycles))])
+            self.actionSaveSnapshot.setEnabled(True)
+            self.actionWriteVision.setEnabled(True)
+            self.actionWriteVision2.setEnabled(True)
+            self.stopFollowing()
+
+    def clearCycles(self):
+        """Remove all cycles from the window."""
+
+        self.cycles = []
+        self.cycleCombo.clear()
+        self.timeCombo.clear()
+        self.matCombo.clear()
+        self.dataTree.clear()
+
+    def stopFollowing(self):
+        """Stop polling a followed ERANOS output."""
+
+        self.followTimer.stop()
+        self.follower = None
+
     def saveText(self):
         """
         Write out all ERANOS data to a specified file.
@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+
+"""
+On-disk cache of the data loaded from an ERANOS output file, so that
+reopening the same output does not parse it again.
+
+A cache file starts with a line identifying the format, a JSON header
+line with what the cache depends on (see fileKey) and a line with an
+HMAC-SHA256 signature of the header and the pickled data that follows,
+made with a key private to the user. A cache file is only unpickled
+once its header matches the output and its signature is correct, so a
+file planted next to an output is never unpickled.
+"""
+
+from __future__ import division, print_function
+import os
+import sys
+import zlib
+import json
+import hmac
+import hashlib
+import tempfile
+from collections import MutableMapping, OrderedDict
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from nucleardata import nuclearData, replaceFile
+
+# Increment whenever the layout of the cached data changes
+cacheVersion = 7
+cacheSuffix = ".eptcache"
+cacheMagic = b"EPTCACHE\n"
+
+def loadCache(filename, lazy=False):
+    """
+    Return the data cached for the ERANOS output 'filename' by a load
+    with the same 'lazy' mode, in the form returned by eranos.loadData,
+    or None if there is no valid cache. The materials of each cycle
+    are only decoded when the cycle is first used.
+    """
+
+    key = secretKey()
+    if key is None:
+        return None
+    for path in cachePaths(filename):
+        try:
+            fh = open(path, "rb")
+            try:
+                header, payload = readEntry(fh, key)
+            finally:
+                fh.close()
+        except (IOError, OSError, ValueError):
+            continue
+        if header is None or not isValid(header, filename, lazy):
+            continue
+        entry = pickle.loads(payload)
+        data = pickle.loads(zlib.decompress(entry["data"]))
+        for cycle, blob in zip(data[0], entry["materials"]):
+            if lazy:
+                # Only the offsets of lazily loaded materials are cached
+                cycle.materials = pickle.loads(zlib.decompress(blob))
+            else:
+                cycle.materials = CachedMaterials(blob)
+        return data
+    return None
+
+def saveCache(filename, data, lazy=False):
+    """
+    Write the data returned by eranos.loadData for the ERANOS output
+    'filename' to a cache file next to the output, or to the user
+    cache directory if that is not writable. Returns the path written
+    or None. For lazily loaded cycles only the offsets of the materials
+    are written. The materials of other cycles are written as (key,
+    material) pairs, so that they are read back in the same order. The
+    cache is written to a temporary file that then replaces the cache
+    file, so that another process never reads it half written.
+    """
+
+    key = secretKey(create=True)
+    if key is None:
+        return None
+    header = fileKey(filename, lazy)
+    header["digest"] = fileDigest(filename)
+
+    cycles = data[0]
+    entry = {"materials": []}
+    for cycle in cycles:
+        materials = cycle.materials
+        if not lazy:
+            materials = materials.items()
+        entry["materials"].append(
+            zlib.compress(pickle.dumps(materials, 2), 1))
+
+    # Cycles are stored without their materials
+    saved = [cycle.materials for cycle in cycles]
+    try:
+        for cycle in cycles:
+            cycle.materials = {}
+        entry["data"] = zlib.compress(pickle.dumps(data, 2), 1)
+    finally:
+        for cycle, materials in zip(cycles, saved):
+            cycle.materials = materials
+    header = json.dumps(header, sort_keys=True).encode("ascii") + b"\n"
+    payload = pickle.dumps(entry, 2)
+    signature = sign(key, header, payload).encode("ascii") + b"\n"
+
+    for path in cachePaths(filename):
+        try:
+            directory = os.path.dirname(path)
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            fd, temporary = tempfile.mkstemp(cacheSuffix, ".tmp", directory)
+        except (IOError, OSError):
+            continue
+        try:
+            fh = os.fdopen(fd, "wb")
+            try:
+                fh.write(cacheMagic + header + signature)
+                fh.write(payload)
+            finally:
+                fh.close()
+            replaceFile(temporary, path)
+            return path
+        except (IOError, OSError):
+            os.remove(temporary)
+            continue
+    return None
+
+def readEntry(fh, key):
+    """
+    Read a cache file from the open file 'fh'. Returns the decoded
+    header and the pickled data, still undecoded, or (None, None) if
+    the file is not a cache file or is not signed with 'key'.
+    """
+
+    if fh.read(len(cacheMagic)) != cacheMagic:
+        return None, None
+    header = fh.readline()
+    signature = fh.readline().strip()
+    payload = fh.read()
+    expected = sign(key, header, payload).encode("ascii")
+    if not hmac.compare_digest(signature, expected):
+        return None, None
+    return json.loads(header.decode("ascii")), payload
+
+def sign(key, header, payload):
+    """Return the hex HMAC-SHA256 of a cache header and its data"""
+
+    mac = hmac.new(key, header, hashlib.sha256)
+    mac.update(payload)
+    return mac.hexdigest()
+
+def secretKey(create=False):
+    """
+    Return the key private to the user that signs cache files, kept in
+    the user cache directory. If there is none, it is created if
+    'create' is True and None is returned otherwise.
+    """
+
+    path = os.path.join(userCacheDir(), "key")
+    try:
+        fh = open(path, "rb")
+        try:
+            return fh.read() or None
+        finally:
+            fh.close()
+    except (IOError, OSError):
+        if not create:
+            return None
+    key = os.urandom(32)
+    try:
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory, 0o700)
+        flags = (os.O_WRONLY | os.O_CREAT | os.O_EXCL |
+                 getattr(os, "O_BINARY", 0))
+        fd = os.open(path, flags, 0o600)
+        try:
+            os.write(fd, key)
+        finally:
+            os.close(fd)
+    except (IOError, OSError):
+        # Another process may have created the key in the meantime
+        return secretKey()
+    return key
+
+def cachePaths(filename):
+    """
+    Return the candidate cache files for an ERANOS output: a sidecar
+    file next to it and a file in the user cache directory.
+    """
+
+    filename = os.path.abspath(filename)
+    name = hashlib.sha1(filename.encode("utf-8")).hexdigest() + cacheSuffix
+    return [filename + cacheSuffix, os.path.join(userCacheDir(), name)]
+
+def userCacheDir():
+    """Return the per-user directory for cache files"""
+
+    if sys.platform.startswith("win"):
+        base = os.environ.get("LOCALAPPDATA", os.path.expanduser("~"))
+        return os.path.join(base, "EPT", "cache")
+    base = os.environ.get("XDG_CACHE_HOME",
+                          os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(base, "ept")
+
+def fileKey(filename, lazy=False):
+    """
+    Return a dictionary with what a cache of 'filename' depends on:
+    cache layout version, the fission product yields, whether the
+    materials were loaded lazily, and the file's size and modification
+    time.
+    """
+
+    stat = os.stat(filename)
+    return {"version": cacheVersion,
+            "yields": yieldDigest(),
+            "lazy": bool(lazy),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime}
+
+def isValid(entry, filename, lazy=False):
+    """
+    Determine whether a cache entry belongs to the current contents of
+    'filename' loaded in the given 'lazy' mode. The content hash is
+    only computed when the file size matches but its modification time
+    does not.
+    """
+
+    key = fileKey(filename, lazy)
+    for name in ["version", "yields", "lazy", "size"]:
+        if entry.get(name) != key[name]:
+            return False
+    if entry.get("mtime") == key["mtime"]:
+        return True
+    return entry.get("digest") == fileDigest(filename)
+
+def fileDigest(filename):
+    """Return the SHA-1 hash of the contents of 'filename'"""
+
+    sha = hashlib.sha1()
+    fh = open(filename, "rb")
+    try:
+        while True:
+            block = fh.read(1 << 20)
+            if not block:
+                break
+            sha.update(block)
+    finally:
+        fh.close()
+    return sha.hexdigest()
+
+_yieldDigest = None
+
+def yieldDigest():
+    """Return a hash of the pf fission product yields"""
+
+    global _yieldDigest
+    if _yieldDigest is None:
+        parents, daughters, fractions = nuclearData().table("pf")
+        sha = hashlib.sha1(repr((parents, daughters)).encode())
+        sha.update(fractions.tobytes())
+        _yieldDigest = sha.hexdigest()
+    return _yieldDigest
+
+
+class CachedMaterials(MutableMapping):
+    """
+    Dictionary of the materials of one cycle that is only decoded from
+    its compressed cache data when first used. The materials are kept
+    in the order they had when cached.
+    """
+
+    def __init__(self, blob):
+        self._blob = blob
+        self._materials = None
+
+    def _load(self):
+        if self._materials is None:
+            blob, self._blob = self._blob, None
+            self._materials = OrderedDict(pickle.loads(zlib.decompress(blob)))
+        return self._materials
+
+    def __getitem__(self, key):
+        return self._load()[key]
+
+    def __setitem__(self, key, value):
+        self._load()[key] = value
+
+    def __delitem__(self, key):
+        del self._load()[key]
+
+    def __contains__(self, key):
+        return key in self._load()
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def __reduce__(self):
+        return (dict, (self.items(),))
@@ -4,6 +4,8 @@
 Class definition for a cycle
 """
 
+from collections import MutableMapping
+
 class Cycle():
     """
     Create new instance of a cycle
@@ -15,6 +17,7 @@ class Cycle():
       
       materials is a dictionary of the form:
         {(timenode, material): <Material instance>, ...}
+        or a LazyMaterials mapping with the same keys
     """
 
 
@@ -55,3 +58,82 @@ class Cycle():
         nameList.sort()
         return nameList
 
+
+class MaterialStub(object):
+    """
+    Location of a MATERIAL block in an ERANOS output and the attributes
+    to set on the Material once it is read.
+    """
+
+    attributes = ["nuFissionRate", "absorptionRate", "diffRate", "flux",
+                  "power", "dpa"]
+
+    def __init__(self, offset):
+        self.offset = offset
+        for name in self.attributes:
+            setattr(self, name, None)
+
+    def apply(self, material):
+        """Set the attributes recorded on the stub on a Material"""
+
+        for name in self.attributes:
+            value = getattr(self, name)
+            if value is not None:
+                setattr(material, name, value)
+
+
+class LazyMaterials(MutableMapping):
+    """
+    Dictionary of the form {(timenode, material): <Material instance>}
+    whose materials are only read from the ERANOS output when a key is
+    first used.
+
+    Materials are held by the source in a least-recently-used cache of
+    bounded size shared by all cycles, so a material that has been
+    evicted is read again on its next use. Materials assigned with
+    cycle.materials[key] = material are kept as given.
+
+    Attributes:
+      source = object with a material(stub) method, e.g. an
+               eranos.MaterialSource
+      stubs = dictionary of the form {(timenode, material): MaterialStub}
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.stubs = {}
+        self.assigned = {}
+
+    def addStub(self, key, offset):
+        """Record the offset of the MATERIAL block for key"""
+
+        self.stubs[key] = MaterialStub(offset)
+        self.assigned.pop(key, None)
+        return self.stubs[key]
+
+    def __getitem__(self, key):
+        if key in self.assigned:
+            return self.assigned[key]
+        return self.source.material(self.stubs[key])
+
+    def __setitem__(self, key, material):
+        self.stubs.pop(key, None)
+        self.assigned[key] = material
+
+    def __delitem__(self, key):
+        if key in self.assigned:
+            del self.assigned[key]
+        else:
+            del self.stubs[key]
+
+    def __contains__(self, key):
+        return key in self.stubs or key in self.assigned
+
+    def __iter__(self):
+        for key in self.stubs:
+            yield key
+        for key in self.assigned:
+            yield key
+
+    def __len__(self):
+        return len(self.stubs) + len(self.assigned)
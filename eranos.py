@@ -8,380 +8,1087 @@ form that VISION can use.
 """
 
 from __future__ import division, print_function
+import os
 import re
 import math
+import weakref
+import multiprocessing
+from collections import OrderedDict
 
-from PyQt4.QtCore import *
-from PyQt4.QtGui import *
+from isotope import Isotope, FissionProduct, nuclide
+from material import Material, expandMaterials
+from cycle import Cycle, LazyMaterials
+from fileIO import PatternScanner, CompressedFile, openFile, seekable
+from cache import loadCache, saveCache
+from progress import NullProgress, QtProgress
 
-from isotope import Isotope, FissionProduct
-from material import Material
-from cycle import Cycle
-from fileIO import fileReSeek, fileReSeekList
-from parameters import pf
+# Markers in the ERANOS output, compiled once and shared by all parsers
+reListe = re.compile("^->LISTE_MILIEUX.*")
+reFuel = re.compile("'(FUEL\d+)'")
+reBlanket = re.compile("^->BLANKET.*")
+reCooling = re.compile("^->COOLINGTIME\s+(\S+).*")
+reCycle = re.compile(".*->CYCLE\s+(\d+).*")
+rePasse = re.compile("^->PASSE\s\((\d+)\).*")
+reIter = re.compile("^->ITER\s(\d+).*")
+reEcco = re.compile(" ECCO6.*")
+reRegion = re.compile("\sREGION :(FUEL\d+|BLANK)\s*")
+reTotal = re.compile("\s*TOTAL\s+(\S+)\s+(\S+)\s+\S+\s+(\S+).*")
+reFlux = re.compile("\s*TOTAL FLUX =\s+(\S+)\s*")
+reBalance = re.compile(".*M A T E R I A L   B A L A N C E.*")
+reMaterialRow = re.compile(r"^[ \t]*\S+[ \t]+(\S+)[ \t]+\S+[ \t]+(\S+)",
+                           re.M)
+reMaterial = re.compile("\s+MATERIAL\s(FUEL\d+|BLANK)\s+")
+reRequired = re.compile(" 'REQUIRED FEED FOR FUEL (\d).*")
+reAdditional = re.compile(" 'ADDITIONAL FEED FOR FUEL (\d).*")
+reReplmass2 = re.compile(" ->REPLMASS2\s+(\S+).*")
+reReplmass1 = re.compile(" ->REPLMASS1\s+(\S+).*")
+reReplmass = re.compile(" ->REPLMASS\s+(\S+).*")
+reExtra = re.compile(" ->EXTRA\s+(\S+).*")
+rePower = re.compile(" ->POWER\d\s+(\S+).*")
+rePowerB = re.compile(" ->POWERB\s+(\S+).*")
+reDpaFuel = re.compile(" 'DPA of FUEL (\d).*")
+reDpaBlanket = re.compile(" 'DPA of BLANKET'.*")
+reDpaFuelValue = re.compile(" ->DPA\dC\s+(\S+).*")
+reDpaBlanketValue = re.compile(" ->DPABC\s+(\S+).*")
 
-def loadData(filename, parent=None, gui=True):
+# Charge (CH*) and discharge (DIS*) vectors at the end of the output.
+# vectorNames are the ones every run writes, in file order, and
+# streamNames the streams loadData returns after the cycles, in order:
+# those vectors and the sums of all charge and all discharge vectors.
+# Vectors of additional streams carry the same names numbered from 2,
+# e.g. CHBLANK2.
+vectorNames = ["CHARGE", "DISCHARGE", "CHBLANK", "DISBLANK"]
+streamNames = vectorNames + ["ONESTREAMCH", "ONESTREAMDIS"]
+reVector = re.compile(" ->((?:{0})\d*)\s+(.*)".format("|".join(vectorNames)))
+
+# Literal text contained in every line a marker matches, searched for
+# before the regular expression is tried
+anchors = {
+    reListe: b"->LISTE_MILIEUX",
+    reBlanket: b"->BLANKET",
+    reCooling: b"->COOLINGTIME",
+    reCycle: b"->CYCLE",
+    rePasse: b"->PASSE",
+    reIter: b"->ITER",
+    reEcco: b"ECCO6",
+    reRegion: b"REGION :",
+    reTotal: b"TOTAL",
+    reFlux: b"TOTAL FLUX =",
+    reBalance: b"M A T E R I A L   B A L A N C E",
+    reMaterial: b"MATERIAL",
+    reRequired: b"'REQUIRED FEED FOR FUEL ",
+    reAdditional: b"'ADDITIONAL FEED FOR FUEL ",
+    reReplmass2: b"->REPLMASS2",
+    reReplmass1: b"->REPLMASS1",
+    reReplmass: b"->REPLMASS",
+    reExtra: b"->EXTRA",
+    rePower: b"->POWER",
+    rePowerB: b"->POWERB",
+    reDpaFuel: b"'DPA of FUEL ",
+    reDpaBlanket: b"'DPA of BLANKET'",
+    reDpaFuelValue: b"->DPA",
+    reDpaBlanketValue: b"->DPABC",
+    reVector: b" ->"}
+
+# Size of the blocks in which loadData reads an ERANOS output
+blockSize = 1 << 20
+
+listeiso = ['Th232','Pa231','Pa233','U232','U233','U234','U235','U236','U238','Np237',
+            'Np239','Np238','Pu238','Pu239','Pu240','Pu241','Pu242','Am241','Am242g',
+            'Am242m','Am243','Cm242','Cm243','Cm244','Cm245','Cm246','Cm247','Cm248',
+            'Bk249','Cf249','Cf250','Cf251','Cf252','sfpU234','sfpU235','sfpU236',
+            'sfpU238','sfpNp237','sfpPu238','sfpPu239','sfpPu240','sfpPu241','sfpPu242',
+            'sfpAm241','sfpAm242m','sfpAm243','sfpCm243','sfpCm244','sfpCm245']
+
+def loadData(filename, parent=None, gui=True, useCache=False, lazy=False,
+             workers=None, progress=None, expand=False):
     """
     Loads material data from an ERANOS output file.
 
+    The file is read once from top to bottom; see EranosParser. If
+    useCache is True, the data is taken from the cache of a previous
+    load with the same lazy mode when the file and fission product
+    yields are unchanged, and is cached after loading otherwise.
+
+    If lazy is True, only the offsets of the MATERIAL blocks are
+    recorded and the materials of each cycle are a LazyMaterials
+    mapping, read when first used. This needs a file that can be read
+    at any offset (see fileIO.seekable): xz and zstd compressed outputs
+    raise ValueError.
+
+    If workers is given, the MATERIAL blocks of each cycle are read in a
+    pool of that many processes once the offsets of all blocks are
+    known. The cycles are returned in the same order.
+
+    Each material expands its fission products when its isotopes are
+    first used. If expand is True (and neither lazy nor workers is
+    given), the fission products of all materials are expanded before
+    returning instead.
+
+    Progress is reported to 'progress', an object with the methods of
+    progress.NullProgress. By default a QtProgress dialog on 'parent'
+    is used if gui is True, and nothing is reported otherwise.
+
     Returns a list 'cycles' with all the Cycle instances.
     """
 
-    # Open file
-    eranosFile = open(filename, "r")
-    cycles = []
+    if lazy:
+        checkSeekable(filename)
+    if progress is None:
+        progress = QtProgress(parent) if gui else NullProgress()
 
-    # Find the names of all the fuel regions
-    fuelNames = []
-    m = fileReSeek(eranosFile, "^->LISTE_MILIEUX.*")
-    fuelNames += re.findall("'(FUEL\d+)'", m.group())
-    while True:
-        line = eranosFile.readline().strip()
-        fuelNames += re.findall("'(FUEL\d+)'", line)
-        if line[-1] == ";": break
-
-    # Determine if there is a blanket material
-    m = fileReSeek(eranosFile, "^->BLANKET.*")
-    if m:
-        fuelNames += ["BLANK"]
+    if useCache:
+        data = loadCache(filename, lazy)
+        if data is not None:
+            if (not lazy and not workers and expand and
+                    not expandAll(data[0], progress)):
+                return None
+            return data
+
+    # Report progress over the size of the file in kB, compressed or
+    # not
+    size = os.path.getsize(filename)
+    progress.start("Loading ERANOS Data...", size//1024)
+
+    # Read the file, feeding each line to the parser
+    if lazy:
+        parser = EranosParser(materialSource(filename))
+    elif workers:
+        parser = EranosParser(MaterialSource(filename))
     else:
-        eranosFile.seek(0)
-    
-    # Determine default cooling period
-    position = eranosFile.tell()
-    m = fileReSeek(eranosFile, "^->COOLINGTIME\s+(\S+).*")
-    if m:
+        parser = EranosParser()
+    eranosFile = openFile(filename)
+    compressed = isinstance(eranosFile, CompressedFile)
+    while True:
+        data = eranosFile.read(blockSize) + eranosFile.readline()
+        if not data:
+            break
+        parser.feedData(data)
+        done = eranosFile.rawTell() if compressed else parser.position
+        if not progress.update(done//1024):
+            eranosFile.close()
+            progress.finish()
+            return None
+    eranosFile.close()
+    progress.finish()
+    parser.finish()
+
+    cycles = parser.cycles
+    charge, discharge, chblank, disblank, onestreamch, onestreamdis = \
+        parser.streams()
+
+    if workers and not lazy:
+        if not readParallel(cycles, workers, progress):
+            return None
+
+    # The cache holds the materials before their fission products are
+    # expanded, as for any other load
+    data = (cycles, charge, discharge, chblank, disblank, onestreamch,
+            onestreamdis)
+    if useCache:
+        saveCache(filename, data, lazy)
+    if not lazy and not workers and expand:
+        if not expandAll(cycles, progress):
+            return None
+    return data
+
+
+def checkSeekable(filename):
+    """
+    Raise ValueError if the materials of 'filename' cannot be read
+    lazily because it cannot be read at any offset
+    """
+
+    if not seekable(filename):
+        raise ValueError("{0} is compressed in a format that can only be "
+                         "read from the start; load it with lazy=False "
+                         "or recompress it with gzip".format(filename))
+
+def expandAll(cycles, progress=None):
+    """
+    Expand the fission products of every material in 'cycles'. Returns
+    False if cancelled through 'progress'.
+    """
+
+    if progress is None:
+        progress = NullProgress()
+    n_materials = sum([len(cycle.materials) for cycle in cycles])
+    progress.start("Expanding fission products...", n_materials)
+
+    pValue = 0
+    for cycle in cycles:
+        print("Expanding fission products for Cycle {0}...".format(cycle.n))
+        materials = cycle.materials.values()
+        expandMaterials(materials)
+        pValue += len(materials)
+        if not progress.update(pValue):
+            progress.finish()
+            return False
+    progress.finish()
+    return True
+
+def readParallel(cycles, workers, progress=None):
+    """
+    Replace the LazyMaterials of every cycle by a dictionary of its
+    materials, read by a pool of 'workers' processes with
+    one task per cycle. Returns False if cancelled through 'progress'.
+    """
+
+    if progress is None:
+        progress = NullProgress()
+    progress.start("Reading materials...", len(cycles))
+
+    tasks = []
+    for cycle in cycles:
+        materials = cycle.materials
+        tasks.append((materials.source.filename, materials.stubs.items()))
+
+    pool = multiprocessing.Pool(workers)
+    try:
+        results = pool.imap(_readStubs, tasks)
+        for pValue, cycle in enumerate(cycles):
+            # Adding the materials in file order, as a serial load
+            # does, gives a dictionary that iterates the same way
+            materials = dict(results.next())
+            materials.update(cycle.materials.assigned)
+            cycle.materials = materials
+            if not progress.update(pValue + 1):
+                return False
+    finally:
+        pool.terminate()
+        progress.finish()
+    return True
+
+def _readStubs(task):
+    """
+    Read the materials for a list of (key, MaterialStub) from an
+    ERANOS output and return a list of (key, material) in file order.
+    Runs in a worker process of readParallel.
+    """
+
+    filename, stubs = task
+    fh = openFile(filename)
+    # Read the blocks in file order, so that a compressed file is only
+    # read forward
+    materials = []
+    for key, stub in sorted(stubs, key=lambda item: item[1].offset):
+        name, material = readMaterialAt(fh, stub.offset)
+        stub.apply(material)
+        materials.append((key, material))
+    fh.close()
+    return materials
+
+
+class EranosFollower(object):
+    """
+    Incremental loading of an ERANOS output that is still being
+    written. Each call to poll() parses only the complete lines
+    appended since the previous call, keeping the parser state between
+    calls, and returns the cycles whose data has been completed.
+
+    Attributes:
+      filename = path of the ERANOS output
+      cycles = list of the completed Cycle instances
+      finished = True once the charge/discharge vectors at the end of
+                 the run have been read
+      appended = number of bytes read by the last poll()
+      reset = True if the last poll() read the file again from the
+              start because it had been truncated
+    """
+
+    def __init__(self, filename, lazy=False):
+        if lazy:
+            checkSeekable(filename)
+        self.filename = filename
+        self.lazy = lazy
+        self.reset = False
+        self._reset()
+
+    def _reset(self):
+        self.cycles = []
+        self.finished = False
+        if self.lazy:
+            self.parser = EranosParser(materialSource(self.filename))
+        else:
+            self.parser = EranosParser()
+        self._position = 0
+        self._partial = b""
+        self.appended = 0
+
+    def poll(self):
+        """
+        Parse the lines appended to the file since the last call and
+        return a list of the newly completed Cycle instances. If the
+        file has been truncated it is read again from the start, and
+        reset is set so that the cycles returned before can be dropped.
+        """
+
+        self.reset = os.path.getsize(self.filename) < self._position
+        if self.reset:
+            self._reset()
+        fh = open(self.filename, "rb")
+        fh.seek(self._position)
+        data = fh.read()
+        self._position = fh.tell()
+        self.appended = len(data)
+        fh.close()
+
+        # Only feed complete lines
+        data = self._partial + data
+        end = data.rfind(b"\n") + 1
+        self._partial = data[end:]
+        self.parser.feedData(data[:end])
+
+        cycles = self.parser.cycles[len(self.cycles):self.parser.completed]
+        self.cycles += cycles
+        self.finished = all(name in self.parser.vectors
+                            for name in vectorNames)
+        return cycles
+
+    def finish(self):
+        """
+        Complete loading once the run has finished and return the same
+        tuple as loadData.
+        """
+
+        self.poll()
+        if self._partial:
+            self.parser.feed(self._partial)
+            self._partial = b""
+        self.parser.finish()
+        cycles = self.parser.cycles
+        self.cycles = cycles
+        return (cycles,) + self.parser.streams()
+
+
+class EranosParser(object):
+    """
+    Single-pass parser for an ERANOS output file.
+
+    Lines are handed to feed(), or blocks of lines to feedData(), in
+    file order and dispatched to handlers for LISTE_MILIEUX,
+    CYCLE/PASSE/ITER, ECCO6 REGION/TOTAL, MATERIAL BALANCE, FEED, DPA
+    and CHARGE/DISCHARGE. Each sequential search of
+    the old loadData is kept by a _Cursor so that the file never needs
+    to be rewound. The tail of the output (charge/discharge vectors,
+    POWERB and the final ECCO_BLANK calculation) is searched for from
+    the end of the feed data of the last cycle, so those cursors are
+    started every time a cycle's feeds have been read and dropped when
+    the next cycle starts.
+
+    If a MaterialSource is given, MATERIAL blocks are not read. Their
+    offsets are recorded as stubs in a LazyMaterials mapping for each
+    cycle instead.
+
+    Attributes:
+      fuelNames = names of the fuel regions (and BLANK)
+      cycles = list of Cycle instances read so far
+      vectors = ordered dictionary of the form {"CHARGE": <list>, ...}
+                with the masses of each vector aligned with listeiso
+      position = byte offset of the line being processed
+      completed = number of cycles whose data has been read entirely
+    """
+
+    # Searches for the anchors of the expected patterns, keyed by tuple
+    # of the PatternScanners of the cursors
+    _anchors = {}
+
+    def __init__(self, source=None):
+        self.source = source
+        self.position = 0
+        self.completed = 0
+        self.fuelNames = []
+        self.cycles = []
+        self.vectors = OrderedDict()
+        self.powerB = None
+
+        self._blanketSeen = False
+        self._coolingSeen = False
+        self._autoCooling = False
+        self._coolingTime = None
+        self._finalBlocks = []
+        self._finalRates = []
+
+        # Cursor over the input echo at the top of the file
+        self._header = _Cursor()
+        self._header.expect((reListe, self._onListe))
+
+        # Cursor over the material balance data of each cycle
+        self._data = _Cursor()
+        self._data.expect((reEcco, self._onEcco))
+        self._nextCycle = 0
+
+        self._tail = []
+
+    def feedData(self, data):
+        """
+        Process a block of whole lines of the ERANOS output. Unless a
+        cursor is reading every line, the lines up to the next one
+        containing the literal anchor of an expected pattern are
+        skipped with a single search.
+        """
+
+        pos = 0
+        end = len(data)
+        while pos < end:
+            anchor = self._anchor()
+            if anchor is not None:
+                hit = anchor.search(data, pos)
+                if hit is None:
+                    self.position += end - pos
+                    return
+                start = max(data.rfind(b"\n", pos, hit.start()) + 1, pos)
+                self.position += start - pos
+                pos = start
+            lineEnd = data.find(b"\n", pos)
+            lineEnd = end if lineEnd < 0 else lineEnd + 1
+            self.feed(data[pos:lineEnd])
+            pos = lineEnd
+
+    def _anchor(self):
+        """
+        Return a compiled search for the literals of all the patterns
+        expected by the cursors, or None if a cursor reads every line.
+        """
+
+        scanners = []
+        for cursor in [self._header, self._data] + self._tail:
+            if cursor.lineHandler:
+                return None
+            if cursor.scanner:
+                scanners.append(cursor.scanner)
+        key = tuple(scanners)
+        anchor = self._anchors.get(key)
+        if anchor is None:
+            literals = set()
+            for scanner in scanners:
+                literals.update(scanner.literals)
+            anchor = re.compile(b"|".join([re.escape(literal) for literal
+                                           in sorted(literals, key=len,
+                                                     reverse=True)]))
+            self._anchors[key] = anchor
+        return anchor
+
+    def feed(self, line):
+        """Process the next line of the ERANOS output."""
+
+        # Cursors restarted by this line only see the lines after it
+        tail = self._tail
+        self._header.feed(line)
+        self._data.feed(line)
+        for cursor in tail:
+            cursor.feed(line)
+        self.position += len(line)
+
+    def finish(self):
+        """
+        Complete parsing once the whole file has been fed. The final
+        cycle with the reaction rates of the ECCO_BLANK calculation is
+        appended to the list of cycles.
+        """
+
+        try:
+            self._material(self.cycles[-1], (5,"BLANK")).power = \
+                float(self.powerB)
+        except (IndexError, KeyError, TypeError):
+            print('WARNING: No Blanket Discharge Power')
+
+        # Determine reaction rates for FUEL3, FUEL6, FUEL9, and
+        # BLANK from the material balance and ECCO calculation
+        # following the last cycle.
+        cycle = self._newCycle(len(self.cycles) + 1, 0, 0, 0)
+        self.cycles.append(cycle)
+        try:
+            for block in self._finalBlocks:
+                self._store(cycle, (0,block.name), block)
+            for name, nuSigmaF, SigmaA, Diff, flux in self._finalRates:
+                material = self._material(cycle, (0,name))
+                material.nuFissionRate = nuSigmaF
+                material.absorptionRate = SigmaA
+                material.diffRate = Diff
+                material.flux = flux
+            if len(self._finalRates) < 4:
+                raise ValueError
+        except (KeyError, ValueError):
+            # No ECCO calculation at end?
+            print('WARNING: No ECCO_BLANK calculation at end of run?')
+
+    def streams(self):
+        """
+        Return charge, discharge, chblank, disblank, onestreamch and
+        onestreamdis Material instances built from the charge and
+        discharge vectors at the end of the output.
+        """
+
+        materials = self.streamMaterials()
+        return tuple(materials.get(name, Material())
+                     for name in streamNames)
+
+    def streamMaterials(self):
+        """
+        Return a dictionary of the form {name: <Material instance>}
+        with a material for every vector read, and ONESTREAMCH and
+        ONESTREAMDIS for the sums of the charge (CH*) and discharge
+        (DIS*) vectors.
+        """
+
+        materials = {}
+        totals = {}
+        for name, value in self.vectors.items():
+            materials[name] = vectorMaterial(value)
+            stream = "ONESTREAMCH" if name.startswith("CH") else "ONESTREAMDIS"
+            if stream in totals:
+                totals[stream] = [total + mass for total, mass
+                                  in zip(totals[stream], value)]
+            else:
+                totals[stream] = value
+        for stream, value in totals.items():
+            materials[stream] = vectorMaterial(value)
+        return materials
+
+    def _newCycle(self, n, timestep, iterations, cooling_time):
+        cycle = Cycle(n, timestep, iterations, cooling_time)
+        if self.source:
+            cycle.materials = LazyMaterials(self.source)
+        return cycle
+
+    def _store(self, cycle, key, block):
+        """Store the material of a MATERIAL block, or its stub if lazy"""
+
+        if self.source:
+            cycle.materials.addStub(key, block.offset)
+        else:
+            cycle.materials[key] = block.material()
+
+    def _material(self, cycle, key):
+        """
+        Return the material for key, or its stub if lazy, to set
+        attributes on.
+        """
+
+        if self.source:
+            return cycle.materials.stubs[key]
+        return cycle.materials[key]
+
+    def _readBlock(self, cursor, m, done):
+        """
+        Read the MATERIAL block starting with match m and call
+        done(block) once its closing line has been read. When lazy only
+        the offset of the block is kept.
+        """
+
+        block = _MaterialBlock(m.groups()[0], self.position,
+                               keepLines=not self.source)
+        block.attach(cursor, done)
+
+    # Input echo: fuel names, blanket, cooling time, cycle headers
+
+    def _onListe(self, m):
+        self.fuelNames += reFuel.findall(m.group())
+        self._header.expectLines(self._onListeLine)
+
+    def _onListeLine(self, line):
+        line = line.strip()
+        self.fuelNames += reFuel.findall(line)
+        if line[-1] == ";":
+            self._expectHeaders()
+
+    def _expectHeaders(self):
+        # The blanket and cooling time are only given once
+        patterns = [(reCycle, self._onCycle)]
+        if not self._blanketSeen:
+            patterns.insert(0, (reBlanket, self._onBlanket))
+        if not self._coolingSeen:
+            patterns.insert(0, (reCooling, self._onCooling))
+        self._header.expect(*patterns)
+
+    def _onBlanket(self, m):
+        self._blanketSeen = True
+        self.fuelNames += ["BLANK"]
+        self._expectHeaders()
+
+    def _onCooling(self, m):
+        self._coolingSeen = True
+        self._expectHeaders()
         try:
             if m.groups()[0][:6] == "(PASSE":
-                auto_cooling = True
+                self._autoCooling = True
             else:
-                auto_cooling = False
-                cooling_time = float(m.groups()[0])
+                self._autoCooling = False
+                self._coolingTime = float(m.groups()[0])
         except:
-            cooling_time = 30
-    else:
-        cooling_time = None
-        eranosFile.seek(position)
+            self._coolingTime = 30
 
-    # Determine cycle information
-    while True:
-        m = fileReSeek(eranosFile, ".*->CYCLE\s+(\d+).*")
-        if not m: break
-        n = int(m.groups()[0])
-        m = fileReSeek(eranosFile, "^->PASSE\s\((\d+)\).*")
-        if not m: break
-        timestep = int(m.groups()[0])
-        m = fileReSeek(eranosFile, "^->ITER\s(\d+).*")
+    def _onCycle(self, m):
+        self._cycleInfo = [int(m.groups()[0])]
+        self._header.expect((rePasse, self._onPasse))
+
+    def _onPasse(self, m):
+        self._cycleInfo.append(int(m.groups()[0]))
+        self._header.expect((reIter, self._onIter))
+
+    def _onIter(self, m):
+        n, timestep = self._cycleInfo
         iterations = int(m.groups()[0])
         # Determine cooling period
-        if auto_cooling:
+        if self._autoCooling:
             cooling_time = timestep*iterations*0.15/0.85
-        cycles.append(Cycle(n, timestep, iterations, cooling_time))
-    eranosFile.seek(0)
+        else:
+            cooling_time = self._coolingTime
+        self.cycles.append(self._newCycle(n, timestep, iterations,
+                                          cooling_time))
+        self._expectHeaders()
 
-    # Determine how many materials to read total
-    n_materials = 0
-    for cycle in cycles:
-        n_materials += len(cycle.times())*len(fuelNames)
-    
-    # Create progress bar
-    if gui:
-        progress = QProgressDialog("Loading ERANOS Data...",
-                                   "Cancel", 0, n_materials, parent)
-        progress.setWindowModality(Qt.WindowModal)
-        progress.setWindowTitle("Loading...")
-        progress.setMinimumDuration(0)
-        progress.setValue(0)
-        
-    pValue = 0
-    for cycle in cycles:
-        print("Loading Cycle {0}...".format(cycle.n))
+    # Cycle data: critical mass rates, material balance, feeds and DPA
 
-        # Determine critical mass
-        fileReSeek(eranosFile, " ECCO6.*")
-        xsDict = {}
-        for i in fuelNames:
-            m = fileReSeek(eranosFile, "\sREGION :(FUEL\d+|BLANK)\s*")
-            name = m.groups()[0]
-            m = fileReSeek(eranosFile,
-                           "\s*TOTAL\s+(\S+)\s+(\S+)\s+\S+\s+(\S+).*")
-            nuSigmaF = float(m.groups()[0])
-            SigmaA = float(m.groups()[1])
-            Diff = float(m.groups()[2])
-            xsDict[name] = (nuSigmaF, SigmaA, Diff)
+    def _onEcco(self, m):
+        # Only start on a cycle whose header has been seen
+        if self._nextCycle >= len(self.cycles):
+            return
+        self._cycle = self.cycles[self._nextCycle]
+        self._nextCycle += 1
+        # The tail follows the last cycle, so it is not searched for
+        # again until this cycle's feeds have been read
+        self._tail = []
+        print("Loading Cycle {0}...".format(self._cycle.n))
+        self._xsDict = {}
+        self._regions = len(self.fuelNames)
+        self._data.expect((reRegion, self._onRegion))
 
-        # Find beginning of cycle
-        m = fileReSeek(eranosFile, ".*M A T E R I A L   B A L A N C E.*")
+    def _onRegion(self, m):
+        self._region = m.groups()[0]
+        self._data.expect((reTotal, self._onTotal))
 
-        # Find TIME block and set time
-        for node, time in enumerate(cycle.times()):
-            # Progress bar
-            if gui:
-                QCoreApplication.processEvents()
-                if (progress.wasCanceled()):
-                    return None
-
-            # Loop over fuel names
-            for i in fuelNames:
-                m = fileReSeek(eranosFile,"\s+MATERIAL\s(FUEL\d+|BLANK)\s+")
-                name = m.groups()[0]
-                volume = float(eranosFile.readline().split()[-1])
-                for n in range(5): eranosFile.readline()
-                # Read in material data
-                material = readMaterial(eranosFile)
-                material.volume = volume
-                if time == 0:
-                    material.nuFissionRate = xsDict[name][0]
-                    material.absorptionRate = xsDict[name][1]
-                    material.diffRate = xsDict[name][2]
-                cycle.materials[(node,name)] = material
-                #print (node,name)
-                # Set progress bar value
-                pValue += 1
-                if gui:
-                    progress.setValue(pValue)
-                #print((cycle.n, time, name)) # Only for debugging
-
-        # Read uranium added/required feed
-        for i in range(3):
-            # Determine if there is additional mass or not enough
-            regexList = [" 'REQUIRED FEED FOR FUEL (\d).*",
-                         " 'ADDITIONAL FEED FOR FUEL (\d).*"]
-
-            m, index = fileReSeekList(eranosFile,regexList)
-
-            if index == 0:
-                # We don't have enough fissile material
-                cycle.extraMass = False
-                mat = "FUEL{0}".format(m.groups()[0])
-                m = fileReSeek(eranosFile," ->REPLMASS2\s+(\S+).*")
-                cycle.requiredFeed += float(m.groups()[0])
-                m = fileReSeek(eranosFile," ->REPLMASS1\s+(\S+).*")
-                cycle.uraniumAdded[mat] = float(m.groups()[0])
-                m = fileReSeek(eranosFile," ->POWER\d\s+(\S+).*")
-                cycle.materials[(5,mat)].power = float(m.groups()[0])
-            else:
-                # Additional mass was produced
-                cycle.extraMass = True
-                mat = "FUEL{0}".format(m.groups()[0])
-                m = fileReSeek(eranosFile," ->EXTRA\s+(\S+).*")
-                cycle.additionalFeed[mat] = float(m.groups()[0])
-                m = fileReSeek(eranosFile," ->REPLMASS\s+(\S+).*")
-                cycle.uraniumAdded[mat] = float(m.groups()[0])
-                m = fileReSeek(eranosFile," ->POWER\d\s+(\S+).*")
-                cycle.materials[(5,mat)].power = float(m.groups()[0])
-        
-        posb = eranosFile.tell()
-        for i in range(4):
-            # Get DPA information
-            regexList = [" 'DPA of FUEL (\d).*",
-                         " 'DPA of BLANKET'.*"]
-
-            m, index = fileReSeekList(eranosFile,regexList)
-
-            if index == 0:
-                # We don't have enough fissile material
-                mat = "FUEL{0}".format(m.groups()[0])
-                m = fileReSeek(eranosFile," ->DPA\dC\s+(\S+).*")
-                #print (m.group(), m.groups())
-                #print (mat)
-                cycle.materials[(5,mat)].dpa = float(m.groups()[0])
-            else:
-                # Additional mass was produced
-                mat = "BLANK"
-                m = fileReSeek(eranosFile," ->DPABC\s+(\S+).*")
-                #print (m.group(), m.groups())
-                cycle.materials[(5,mat)].dpa = float(m.groups()[0])
-                #cycle.materials[(0,mat)].dpa = float(m.groups()[0])
-
-
-    eranosFile.seek(posb)
-    # Read charge and discharge vectors at end of ERANOS output file
-    charge = Material()
-    discharge = Material()
-    onestreamch = Material()
-    onestreamdis = Material()
-
-    listeiso = ['Th232','Pa231','Pa233','U232','U233','U234','U235','U236','U238','Np237',
-                'Np239','Np238','Pu238','Pu239','Pu240','Pu241','Pu242','Am241','Am242g',
-                'Am242m','Am243','Cm242','Cm243','Cm244','Cm245','Cm246','Cm247','Cm248',
-                'Bk249','Cf249','Cf250','Cf251','Cf252','sfpU234','sfpU235','sfpU236',
-                'sfpU238','sfpNp237','sfpPu238','sfpPu239','sfpPu240','sfpPu241','sfpPu242',
-                'sfpAm241','sfpAm242m','sfpAm243','sfpCm243','sfpCm244','sfpCm245']
-
-    m = fileReSeek(eranosFile," ->CHARGE\s+(\S+).*")
-    words = m.group().split()
-    words.pop(0)
-    value = [float(val) for val in words]
-    
-    for i in range(10):
-      words = eranosFile.readline().split()
-      value.extend([float(val) for val in words])
-    for iso in range(33):
-      charge.addMass(listeiso[iso],value[iso])
-      onestreamch.addMass(listeiso[iso],value[iso])
-    for iso in range(16):  
-      charge.addMass(listeiso[iso+33],value[iso+33],True)
-      onestreamch.addMass(listeiso[iso+33],value[iso+33],True)
-    charge.expandFPs()
-    
-    m = fileReSeek(eranosFile," ->DISCHARGE\s+(\S+).*")
-
-    words = m.group().split()
-    words.pop(0)
-    value = [float(val) for val in words]
-    
-    for i in range(10):
-      words = eranosFile.readline().split()
-      value.extend([float(val) for val in words])
-    for iso in range(33):
-      discharge.addMass(listeiso[iso],value[iso])
-      onestreamdis.addMass(listeiso[iso],value[iso])
-    for iso in range(16):  
-      discharge.addMass(listeiso[iso+33],value[iso+33],True)
-      onestreamdis.addMass(listeiso[iso+33],value[iso+33],True)
-    discharge.expandFPs()
-
-    chblank = Material()
-    disblank = Material()
-    
-    m = fileReSeek(eranosFile," ->CHBLANK\s+(\S+).*")
-    words = m.group().split()
-    words.pop(0)
-    value = [float(val) for val in words]
-    
-    for i in range(10):
-      words = eranosFile.readline().split()
-      value.extend([float(val) for val in words])
-    for iso in range(33):
-      chblank.addMass(listeiso[iso],value[iso])
-      onestreamch.addMass(listeiso[iso],value[iso])
-    for iso in range(16):  
-      chblank.addMass(listeiso[iso+33],value[iso+33],True)
-      onestreamch.addMass(listeiso[iso+33],value[iso+33],True)
-    chblank.expandFPs()
-    onestreamch.expandFPs()
-
-    m = fileReSeek(eranosFile," ->DISBLANK\s+(\S+).*")    
-    
-    words = m.group().split()
-    words.pop(0)
-    value = [float(val) for val in words]
-    
-    for i in range(10):
-      words = eranosFile.readline().split()
-      value.extend([float(val) for val in words])
-    for iso in range(33):
-      disblank.addMass(listeiso[iso],value[iso])
-      onestreamdis.addMass(listeiso[iso],value[iso])
-    for iso in range(16):  
-      disblank.addMass(listeiso[iso+33],value[iso+33],True)
-      onestreamdis.addMass(listeiso[iso+33],value[iso+33],True)
-    disblank.expandFPs()
-    onestreamdis.expandFPs()
-
-    #posb = eranosFile.tell()
-    eranosFile.seek(posb)
-    try:
-        mat = "BLANK"
-        m = fileReSeek(eranosFile," ->POWERB\s+(\S+).*")
-        n = len(cycles)
-        #print (n, float(m.groups()[0]))
-        cycle.materials[(5,mat)].power = float(m.groups()[0])
-    except:
-        print('WARNING: No Blanket Discharge Power')
-
-    eranosFile.seek(posb)
-    try:
-        # Determine reaction rates for FUEL3, FUEL6, FUEL9, and
-        # BLANK. First we need to load material balance data. Is this
-        # just reading the same data as the last timestep of the last
-        # cycle???
-        n = len(cycles) + 1
-        cycle = Cycle(n, 0, 0, 0)
-        cycles.append(cycle)
-        for i in fuelNames:
-            m = fileReSeek(eranosFile,"\s+MATERIAL\s(FUEL\d+|BLANK)\s+")
-            name = m.groups()[0]
-            volume = float(eranosFile.readline().split()[-1])
-            for n in range(5): eranosFile.readline()
-            # Read in material data
-            material = readMaterial(eranosFile)
-            material.volume = volume
-            cycle.materials[(0,name)] = material
-
-        # Now read fission, absorption, and diffusion rates to be able to
-        # determine the critical mass
-        fuelNames = ['FUEL3', 'FUEL6', 'FUEL9', 'BLANK']
-        fileReSeek(eranosFile, " ECCO6.*")
-        for name in fuelNames:
-            m = fileReSeek(eranosFile, "\sREGION :(FUEL\d+|BLANK)\s*")
+    def _onTotal(self, m):
+        self._xsDict[self._region] = (float(m.groups()[0]),
+                                      float(m.groups()[1]),
+                                      float(m.groups()[2]))
+        self._regions -= 1
+        if self._regions:
+            self._data.expect((reRegion, self._onRegion))
+        else:
+            self._data.expect((reBalance, self._onBalance))
+
+    def _onBalance(self, m):
+        self._blocks = [(node, i) for node, time in enumerate(self._cycle.times())
+                        for i in self.fuelNames]
+        self._blocks.reverse()
+        self._data.expect((reMaterial, self._onMaterial))
+
+    def _onMaterial(self, m):
+        self._readBlock(self._data, m, self._onMaterialRead)
+
+    def _onMaterialRead(self, block):
+        cycle = self._cycle
+        node, i = self._blocks.pop()
+        self._store(cycle, (node,block.name), block)
+        if cycle.times()[node] == 0:
+            material = self._material(cycle, (node,block.name))
+            xs = self._xsDict[block.name]
+            material.nuFissionRate = xs[0]
+            material.absorptionRate = xs[1]
+            material.diffRate = xs[2]
+        if self._blocks:
+            self._data.expect((reMaterial, self._onMaterial))
+        else:
+            self._feeds = 3
+            self._expectFeed()
+
+    def _expectFeed(self):
+        self._data.expect((reRequired, self._onRequired),
+                          (reAdditional, self._onAdditional))
+
+    def _onRequired(self, m):
+        # We don't have enough fissile material
+        self._cycle.extraMass = False
+        self._mat = "FUEL{0}".format(m.groups()[0])
+        self._data.expect((reReplmass2, self._onReplmass2))
+
+    def _onReplmass2(self, m):
+        self._cycle.requiredFeed += float(m.groups()[0])
+        self._data.expect((reReplmass1, self._onReplmass))
+
+    def _onAdditional(self, m):
+        # Additional mass was produced
+        self._cycle.extraMass = True
+        self._mat = "FUEL{0}".format(m.groups()[0])
+        self._data.expect((reExtra, self._onExtra))
+
+    def _onExtra(self, m):
+        self._cycle.additionalFeed[self._mat] = float(m.groups()[0])
+        self._data.expect((reReplmass, self._onReplmass))
+
+    def _onReplmass(self, m):
+        self._cycle.uraniumAdded[self._mat] = float(m.groups()[0])
+        self._data.expect((rePower, self._onPower))
+
+    def _onPower(self, m):
+        self._material(self._cycle, (5,self._mat)).power = \
+            float(m.groups()[0])
+        self._feeds -= 1
+        if self._feeds:
+            self._expectFeed()
+        else:
+            self._dpa = 4
+            self._expectDpa()
+            self._startTail()
+
+    def _expectDpa(self):
+        self._data.expect((reDpaFuel, self._onDpaFuel),
+                          (reDpaBlanket, self._onDpaBlanket))
+
+    def _onDpaFuel(self, m):
+        self._mat = "FUEL{0}".format(m.groups()[0])
+        self._data.expect((reDpaFuelValue, self._onDpaValue))
+
+    def _onDpaBlanket(self, m):
+        self._mat = "BLANK"
+        self._data.expect((reDpaBlanketValue, self._onDpaValue))
+
+    def _onDpaValue(self, m):
+        self._material(self._cycle, (5,self._mat)).dpa = float(m.groups()[0])
+        self._dpa -= 1
+        if self._dpa:
+            self._expectDpa()
+        else:
+            self.completed += 1
+            self._data.expect((reEcco, self._onEcco))
+
+    # End of run: charge/discharge vectors, POWERB, ECCO_BLANK
+
+    def _startTail(self):
+        self.vectors = OrderedDict()
+        self.powerB = None
+        self._finalBlocks = []
+        self._finalRates = []
+
+        vectorCursor = _Cursor()
+        self._expectVector(vectorCursor)
+        self._power = _Cursor()
+        self._power.expect((rePowerB, self._onPowerB))
+        self._final = _Cursor()
+        self._final.expect((reMaterial, self._onFinalMaterial))
+        self._tail = [vectorCursor, self._power, self._final]
+
+    def _expectVector(self, cursor):
+        def onVector(m):
             name = m.groups()[0]
-            m = fileReSeek(eranosFile,
-                           "\s*TOTAL\s+(\S+)\s+(\S+)\s+\S+\s+(\S+).*")
-            cycle.materials[(0,name)].nuFissionRate = float(m.groups()[0])
-            cycle.materials[(0,name)].absorptionRate = float(m.groups()[1])
-            cycle.materials[(0,name)].diffRate = float(m.groups()[2])
-            m = fileReSeek(eranosFile, "\s*TOTAL FLUX =\s+(\S+)\s*")
-            cycle.materials[(0,name)].flux = float(m.groups()[0])
-            #print(m.groups()[0])
-    except:
-        # No ECCO calculation at end?
-        print('WARNING: No ECCO_BLANK calculation at end of run?')
-
-    # Create progress bar
-    if gui:
-        progress = QProgressDialog("Expanding fission products...",
-                                   "Cancel", 0, n_materials, parent)
-        progress.setWindowModality(Qt.WindowModal)
-        progress.setWindowTitle("Loading...")
-        progress.setMinimumDuration(0)
-        progress.setValue(0)
-        
-    pValue = 0
-    # Expand all fission products
-    for cycle in cycles:
-        # Progress bar
-        if gui:
-            QCoreApplication.processEvents()
-            if (progress.wasCanceled()):
-                return None
+            values = []
+            def add(words):
+                # Add the values on a line, returning False if the
+                # vector is malformed
+                try:
+                    values.extend([float(word) for word in words])
+                except ValueError:
+                    return False
+                return len(values) <= len(listeiso)
+            def done():
+                # Values are aligned with listeiso
+                self.vectors[name] = values
+                self._expectVector(cursor)
+            def onLine(line):
+                if not add(line.split()):
+                    # The line may start the next vector
+                    print("WARNING: Skipped malformed {0} vector".format(name))
+                    self._expectVector(cursor)
+                    cursor.feed(line)
+                elif len(values) == len(listeiso):
+                    done()
+            if not add(m.groups()[1].split()):
+                print("WARNING: Skipped malformed {0} vector".format(name))
+            elif len(values) == len(listeiso):
+                done()
+            else:
+                cursor.expectLines(onLine)
+        cursor.expect((reVector, onVector))
 
-        print("Expanding fission products for Cycle {0}...".format(cycle.n))
-        for mat in cycle.materials.values():
-            mat.expandFPs()
+    def _onPowerB(self, m):
+        self.powerB = float(m.groups()[0])
+        self._power.expect()
 
-            # Set progress bar value
-            pValue += 1
-            if gui:
-                progress.setValue(pValue)
+    def _onFinalMaterial(self, m):
+        self._readBlock(self._final, m, self._onFinalRead)
+
+    def _onFinalRead(self, block):
+        self._finalBlocks.append(block)
+        if len(self._finalBlocks) < len(self.fuelNames):
+            self._final.expect((reMaterial, self._onFinalMaterial))
+        else:
+            self._final.expect((reEcco, self._onFinalEcco))
+
+    def _onFinalEcco(self, m):
+        self._final.expect((reRegion, self._onFinalRegion))
+
+    def _onFinalRegion(self, m):
+        self._region = m.groups()[0]
+        self._final.expect((reTotal, self._onFinalTotal))
+
+    def _onFinalTotal(self, m):
+        self._rates = [self._region] + [float(x) for x in m.groups()]
+        self._final.expect((reFlux, self._onFinalFlux))
+
+    def _onFinalFlux(self, m):
+        self._finalRates.append(tuple(self._rates + [float(m.groups()[0])]))
+        if len(self._finalRates) < 4:
+            self._final.expect((reRegion, self._onFinalRegion))
+        else:
+            self._final.expect()
+
+
+class _Cursor(object):
+    """
+    Sequential search over the lines fed to an EranosParser. The cursor
+    waits for a line matching one of its patterns, in the manner of
+    fileReSeekList, and passes the MatchObject to the handler paired
+    with that pattern. Handlers set what the cursor expects next.
+
+    Lines are tested with a PatternScanner, so a regular expression
+    only runs on lines containing its literal from anchors.
+    """
+
+    # PatternScanners shared by all cursors, keyed by tuple of regexes
+    _scanners = {}
+
+    def __init__(self):
+        self.patterns = ()
+        self.scanner = None
+        self.lineHandler = None
+
+    def expect(self, *patterns):
+        """Wait for one of the given (compiled regex, handler) pairs."""
+
+        self.patterns = patterns
+        self.lineHandler = None
+        self.scanner = None
+        if patterns:
+            key = tuple(p for p, handler in patterns)
+            self.scanner = self._scanners.get(key)
+            if self.scanner is None:
+                self.scanner = PatternScanner([(i, anchors[p], p) for i, p
+                                               in enumerate(key)])
+                self._scanners[key] = self.scanner
+
+    def expectLines(self, handler):
+        """Pass every following line to handler unconditionally."""
+
+        self.patterns = ()
+        self.scanner = None
+        self.lineHandler = handler
+
+    def feed(self, line):
+        if self.lineHandler:
+            self.lineHandler(line)
+            return
+        if self.scanner:
+            hit = self.scanner.matchLine(line)
+            if hit:
+                self.patterns[hit[0]][1](hit[1])
+
+
+class _MaterialBlock(object):
+    """
+    Lines of one MATERIAL block: the volume line, five lines of
+    headings and then one line per isotope, terminated by a line with
+    a single word. If keepLines is False, only the end of the block is
+    looked for and the isotope lines are dropped.
+    """
+
+    def __init__(self, name, offset=None, keepLines=True):
+        self.name = name
+        self.offset = offset
+        self.volume = None
+        self.lines = []
+        self.keepLines = keepLines
+        self._skip = 5
+
+    def attach(self, cursor, done):
+        """Read the block from the lines on cursor and call done(self)."""
+
+        def onLine(line):
+            if self.feed(line):
+                done(self)
+        cursor.expectLines(onLine)
+
+    def feed(self, line):
+        """Add a line to the block. Returns True when it is complete."""
+
+        if self.volume is None:
+            self.volume = float(line.split()[-1])
+        elif self._skip:
+            self._skip -= 1
+        else:
+            if len(line.split()) == 1:
+                return True
+            if self.keepLines:
+                self.lines.append(line)
+        return False
+
+    def material(self):
+        """Return a Material instance for the block."""
+
+        material = parseMaterialChunk(b"".join(self.lines))
+        material.volume = self.volume
+        return material
+
+
+def readMaterialAt(fh, offset):
+    """
+    Read the MATERIAL block whose marker line starts at offset on fh,
+    e.g. a stub offset of LazyMaterials. Returns the region name and a
+    Material instance. fh should be opened with fileIO.openFile.
+    """
+
+    fh.seek(offset)
+    name = reMaterial.match(fh.readline()).groups()[0]
+    volume = float(fh.readline().split()[-1])
+    for n in range(5): fh.readline()
+    material = readMaterial(fh)
+    material.volume = volume
+    return name, material
+
+
+_sources = weakref.WeakValueDictionary()
+
+def materialSource(filename, size=None):
+    """
+    Return the MaterialSource for 'filename', shared by all the
+    LazyMaterials mappings that read from it.
+    """
+
+    filename = os.path.abspath(filename)
+    source = _sources.get(filename)
+    if source is None:
+        source = MaterialSource(filename)
+        _sources[filename] = source
+    if size is not None:
+        source.size = size
+    return source
+
+
+class MaterialSource(object):
+    """
+    Reads materials on demand from an ERANOS output for LazyMaterials,
+    keeping the most recently used ones in memory.
+
+    Attributes:
+      filename = path of the ERANOS output
+      size = maximum number of materials kept in memory
+    """
+
+    def __init__(self, filename, size=100):
+        self.filename = filename
+        self.size = size
+        self._fh = None
+        self._cache = OrderedDict()
+
+    def material(self, stub):
+        """
+        Return the Material for a MaterialStub
+        """
+
+        material = self._cache.pop(stub.offset, None)
+        if material is None:
+            if self._fh is None:
+                self._fh = openFile(self.filename)
+            name, material = readMaterialAt(self._fh, stub.offset)
+            stub.apply(material)
+        self._cache[stub.offset] = material
+        while len(self._cache) > self.size:
+            self._cache.popitem(last=False)
+        return material
+
+    def close(self):
+        """Close the file and drop all materials held in memory"""
+
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        self._cache.clear()
+
+    def __reduce__(self):
+        return (materialSource, (self.filename, self.size))
 
 
-    # Close file and return
-    eranosFile.close()
-    return cycles, charge, discharge, chblank, disblank, onestreamch, onestreamdis
-                
 def readMaterial(fh):
     """
     Read in material data on fh starting from first line (usually Na23)
-    of data and return it in a Material instance.
+    of data and return it in a Material instance. Raises ValueError if
+    the file ends before the line closing the block.
     """
 
-    mat = Material()
+    lines = []
     while True:
-        words = fh.readline().split()
-        if len(words) == 1: break
-        name = words[1]
-        if name == "Am242g":
-            name = "Am242"
-        original_mass = float(words[3])
-        if name[0:3] == "sfp":
-            mat.isotopes[name] = FissionProduct(name,original_mass)
-        else:
-            mat.isotopes[name] = Isotope(name, original_mass)
+        line = fh.readline()
+        if not line:
+            raise ValueError("End of file in a MATERIAL block")
+        if len(line.split()) == 1: break
+        lines.append(line)
+    return parseMaterialChunk(b"".join(lines))
+
+
+def vectorMaterial(value):
+    """
+    Return a Material instance from a list of masses aligned with
+    listeiso.
+    """
+
+    mat = Material()
+    for name, mass in zip(listeiso, value):
+        mat.addMass(name, mass, name[0:3] == "sfp")
+    return mat
+
+
+def parseMaterialChunk(chunk):
+    """
+    Return a Material instance from the isotope lines of a MATERIAL
+    block joined in one string. The name and mass columns of all lines
+    are extracted with a single regular expression search.
+    """
+
+    rows = reMaterialRow.findall(chunk)
+    return buildMaterial([row[0] for row in rows],
+                         [float(row[1]) for row in rows])
+
+
+def buildMaterial(names, masses):
+    """
+    Return a Material instance with the isotopes in the list 'names'
+    and the corresponding masses. Am242g is stored as Am242 and sfp*
+    pseudo-isotopes as FissionProduct instances. Isotope names are
+    looked up in the nuclide registry of the isotope module.
+    """
+
+    isotopes = {}
+    order = []
+    for name, mass in zip(names, masses):
+        entry = nuclideTable.get(name)
+        if entry is None:
+            entry = nuclideEntry(name)
+        key, cls = entry
+        if key not in isotopes:
+            order.append(key)
+        isotopes[key] = cls(key, mass)
+    mat = Material()
+    mat._setIsotopes(isotopes, True, order)
     return mat
 
 
+# Table of the form {name: (key, class)} of the isotopes seen in
+# MATERIAL blocks, so that each name is only checked once
+nuclideTable = {}
+
+def nuclideEntry(name):
+    """Add the isotope 'name' of a MATERIAL block to nuclideTable"""
+
+    key = "Am242" if name == "Am242g" else name
+    if key[0:3] == "sfp":
+        nuclideTable[name] = (key, FissionProduct)
+    else:
+        nuclide(key)
+        nuclideTable[name] = (key, Isotope)
+    return nuclideTable[name]
+
+
 def writeData(filename, cycles):
     """
     Write out all material data in the 'cycles' list to 'filename'.
@@ -1,6 +1,66 @@
 #!/usr/bin/env python
 
+import io
+import os
 import re
+import mmap
+import zlib
+import bisect
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Leading bytes of the compressed formats openFile recognizes
+compressionMagic = [(b"\x1f\x8b", "gzip"),
+                    (b"\xfd7zXZ\x00", "xz"),
+                    (b"\x28\xb5\x2f\xfd", "zstd")]
+
+def openFile(filename):
+    """
+    Open a file for reading in binary mode. Files compressed with gzip,
+    xz or zstd are recognized from their first bytes and returned as a
+    CompressedFile that decompresses them while they are read.
+    """
+
+    format = compressionFormat(filename)
+    if format is not None:
+        return CompressedFile(filename, format)
+    return open(filename, "rb")
+
+def compressionFormat(filename):
+    """
+    Return the compression format of a file recognized from its first
+    bytes, "gzip", "xz" or "zstd", or None if it is not compressed.
+    """
+
+    fh = open(filename, "rb")
+    try:
+        start = fh.read(6)
+    finally:
+        fh.close()
+    for magic, format in compressionMagic:
+        if start.startswith(magic):
+            return format
+    return None
+
+def seekable(filename):
+    """
+    Determine whether a file opened with openFile can be read at
+    arbitrary offsets without decompressing it again from the
+    beginning: uncompressed and gzip files can, xz and zstd files
+    cannot (see CompressedFile).
+    """
+
+    return compressionFormat(filename) in [None, "gzip"]
 
 def fileReSeek(fh, regex):
     """
@@ -35,3 +95,258 @@ def fileReSeekList(fh, regexList):
             match = p.match(line)
             if match:
                 return (match, i)
+
+class PatternScanner(object):
+    """
+    Set of line patterns compiled once and searched for together.
+
+    patterns is a list of the form [(id, literal, regex), ...]. A line
+    matches a pattern when it contains the literal and the regex
+    matches the line from its start, exactly as it would in
+    fileReSeek. The literals are checked first with a plain substring
+    search, so the regular expressions only run on candidate lines.
+
+    Attributes:
+      patterns = list of the form [(id, literal, compiled regex), ...]
+      literals = set of the literals of all the patterns
+
+    Methods:
+      matchLine(line) = (id, MatchObject) for the first matching pattern
+      scan(data, base) = (id, MatchObject, offset) for all hits in data
+      scanFile(filename) = (id, MatchObject, offset) for all hits in a file
+    """
+
+    def __init__(self, patterns):
+        self.patterns = [(id, literal, re.compile(regex))
+                         for id, literal, regex in patterns]
+        self.literals = set(literal for id, literal, regex in self.patterns)
+        self._anchor = re.compile(b"|".join(
+                [re.escape(literal) for literal in sorted(
+                        self.literals, key=len, reverse=True)]))
+
+    def matchLine(self, line):
+        """
+        Return (id, MatchObject) for the first pattern matching line, or
+        None.
+        """
+
+        for id, literal, regex in self.patterns:
+            if literal in line:
+                match = regex.match(line)
+                if match:
+                    return id, match
+        return None
+
+    def scan(self, data, base=0):
+        """
+        Yield (id, MatchObject, offset) for every line of data matching
+        a pattern, in file order, with the offset of the line. data is
+        a string or memory map of whole lines starting at offset base.
+        A line matching several patterns is reported once for each.
+        """
+
+        lineEnd = -1
+        for hit in self._anchor.finditer(data):
+            if hit.start() < lineEnd:
+                continue
+            start = data.rfind(b"\n", 0, hit.start()) + 1
+            lineEnd = data.find(b"\n", hit.start())
+            lineEnd = len(data) if lineEnd < 0 else lineEnd + 1
+            line = data[start:lineEnd]
+            for id, literal, regex in self.patterns:
+                if literal in line:
+                    match = regex.match(line)
+                    if match:
+                        yield id, match, base + start
+
+    def scanFile(self, filename):
+        """
+        Yield (id, MatchObject, offset) for every hit in the file
+        'filename' in one pass, over a memory map of the file or, for
+        compressed files, over blocks of decompressed lines.
+        """
+
+        fh = openFile(filename)
+        try:
+            if isinstance(fh, CompressedFile):
+                while True:
+                    base = fh.tell()
+                    data = fh.read(CompressedFile.blockSize) + fh.readline()
+                    if not data:
+                        break
+                    for hit in self.scan(data, base):
+                        yield hit
+                return
+            if os.fstat(fh.fileno()).st_size == 0:
+                return
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            fh.close()
+        try:
+            for hit in self.scan(mm):
+                yield hit
+        finally:
+            mm.close()
+
+
+class CompressedFile(object):
+    """
+    Read-only binary file object over a gzip, xz or zstd compressed
+    file. The data is decompressed in blocks as it is read, so no
+    temporary file is needed.
+
+    seek() is supported with uncompressed offsets as returned by
+    tell(). Seeking forward decompresses up to the new position. For
+    gzip files the decompressor state is saved every
+    checkpointInterval bytes, so seeking backward resumes from the
+    nearest saved state. The xz and zstd decompressors cannot be
+    copied, so seeking backward in those formats restarts from the
+    beginning; such files should only be read forward.
+    """
+
+    blockSize = 1 << 20
+    checkpointInterval = 32 << 20
+
+    def __init__(self, filename, format):
+        if format == "xz" and lzma is None:
+            raise ImportError("Reading {0} requires the lzma module "
+                              "(backports.lzma on Python 2)".format(filename))
+        if format == "zstd" and zstandard is None:
+            raise ImportError("Reading {0} requires the zstandard "
+                              "package".format(filename))
+        self.name = filename
+        self.format = format
+        self.closed = False
+        self._raw = open(filename, "rb")
+        self._checkpoints = []
+        self._restart()
+
+    def _decompressor(self):
+        if self.format == "gzip":
+            return zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif self.format == "xz":
+            return lzma.LZMADecompressor()
+        else:
+            return zstandard.ZstdDecompressor().decompressobj()
+
+    def _restart(self, checkpoint=None):
+        """Continue decompressing from a checkpoint or the beginning"""
+
+        if checkpoint:
+            position, rawPosition, decompressor = checkpoint
+            self._raw.seek(rawPosition)
+            self._d = decompressor.copy()
+        else:
+            position = 0
+            self._raw.seek(0)
+            self._d = self._decompressor()
+        self._buffer = b""
+        self._bufferStart = position
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        """
+        Decompress more data onto the buffer. Returns False at the end
+        of the file.
+        """
+
+        while not self._eof:
+            data = self._raw.read(self.blockSize)
+            if not data:
+                self._eof = True
+                break
+            out = self._d.decompress(data)
+            # Concatenated members/streams each need a new decompressor
+            while getattr(self._d, "unused_data", b""):
+                data, self._d = self._d.unused_data, self._decompressor()
+                out += self._d.decompress(data)
+            if not out:
+                continue
+            self._bufferStart += self._pos
+            self._buffer = self._buffer[self._pos:] + out
+            self._pos = 0
+
+            # Save the decompressor state for seeking backward
+            end = self._bufferStart + len(self._buffer)
+            last = self._checkpoints[-1][0] if self._checkpoints else 0
+            if (self.format == "gzip" and
+                end - last >= self.checkpointInterval):
+                self._checkpoints.append((end, self._raw.tell(),
+                                          self._d.copy()))
+            return True
+        return False
+
+    def tell(self):
+        return self._bufferStart + self._pos
+
+    def rawTell(self):
+        """Return the position in the compressed file"""
+
+        return self._raw.tell()
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self.tell()
+        elif whence == 2:
+            while self._fill():
+                pass
+            offset += self._bufferStart + len(self._buffer)
+        if offset < self._bufferStart:
+            i = bisect.bisect_right([c[0] for c in self._checkpoints], offset)
+            self._restart(self._checkpoints[i-1] if i else None)
+        # Decompress forward, dropping data before offset
+        while offset > self._bufferStart + len(self._buffer):
+            self._bufferStart += len(self._buffer)
+            self._buffer = b""
+            self._pos = 0
+            if not self._fill():
+                break
+        self._pos = min(offset - self._bufferStart, len(self._buffer))
+
+    def read(self, size=-1):
+        if size < 0:
+            while self._fill():
+                pass
+            size = len(self._buffer) - self._pos
+        while len(self._buffer) - self._pos < size and self._fill():
+            pass
+        data = self._buffer[self._pos:self._pos + size]
+        self._pos += len(data)
+        return data
+
+    def readline(self):
+        while True:
+            i = self._buffer.find(b"\n", self._pos)
+            if i >= 0 or not self._fill():
+                break
+        end = i + 1 if i >= 0 else len(self._buffer)
+        line = self._buffer[self._pos:end]
+        self._pos = end
+        return line
+
+    def __iter__(self):
+        while True:
+            # Split all complete lines in the buffer at once
+            end = self._buffer.rfind(b"\n", self._pos) + 1
+            if end:
+                for line in io.BytesIO(self._buffer[self._pos:end]):
+                    self._pos += len(line)
+                    yield line
+            elif not self._fill():
+                line = self.readline()
+                if line:
+                    yield line
+                return
+
+    def close(self):
+        self._raw.close()
+        self._buffer = b""
+        self._checkpoints = []
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -6,11 +6,101 @@ Class definition for an isotope
 
 import re
 
-class Isotope():
+from nucleardata import nuclearData
+
+class Nuclide(object):
+    """
+    Entry of the nuclide registry with the properties of an isotope
+    name, computed once. Use nuclide(name) to get the shared instance.
+
+    Attributes:
+      name = isotope name as given, e.g. Am242m
+      element = atomic symbol, e.g. Am
+      Z = atomic number
+      A = mass number
+      meta = boolean indicating whether metastable
+      label = isotope name as printed, e.g. Am242m
+      zzaaam = ORIGEN identifier ZZAAAM
+      actinide = boolean indicating whether an actinide
+      minorActinide = boolean indicating whether a minor actinide
+      fissile = boolean indicating whether fissile
+      dataKey = name of the isotope in the nuclear data, or None
+      data = list of the nuclear data of the isotope, or None
+      index = position of the nuclide in the registry
+    """
+
+    __slots__ = ["name", "element", "Z", "A", "meta", "label", "zzaaam",
+                 "actinide", "minorActinide", "fissile", "dataKey", "data",
+                 "index"]
+
+    def __init__(self, name, index):
+        # Parse isotope name
+        m = re.match("([a-zA-Z]+)(\d+)([a-z])*",name)
+
+        self.name = name
+        self.element = m.groups()[0]
+        self.Z = ElementToZ[self.element.upper()]
+        self.A = int(m.groups()[1])
+        self.meta = True if m.groups()[2] == "m" else False
+        self.label = "{0}{1}{2}".format(self.element, self.A,
+                                        "m" if self.meta else "")
+        self.zzaaam = 10000*self.Z + 10*self.A + (1 if self.meta else 0)
+
+        # We define an actinide as any isotope with Z >= 90 and a minor
+        # actinide as any actinide above Th-232 excluding any isotopes
+        # of U and Pu
+        self.actinide = self.Z >= 90
+        self.minorActinide = (self.actinide and self.Z != 92 and
+                              self.Z != 94 and self.A >= 232)
+        self.fissile = self.label.upper() in fissileIsotopes
+
+        data = nuclearData()
+        row = data.index.get(name.upper())
+        self.dataKey = None if row is None else name.upper()
+        self.data = None if row is None else data.data[row].tolist()
+        self.index = index
+
+    def __repr__(self):
+        return "<Nuclide: {0}>".format(self.name)
+
+    def __reduce__(self):
+        return (nuclide, (self.name,))
+
+
+# Registry of the form {name: <Nuclide instance>} shared by all
+# isotopes, the same nuclides in order of their index, and the nuclides
+# by upper case name. The fission products of the yield tables are
+# registered first, when the first nuclide is added, so that the
+# nuclear data is only read once isotopes are used.
+nuclides = {}
+nuclideList = []
+nuclidesUpper = {}
+
+def nuclide(name):
+    """Return the Nuclide for an isotope name, adding it if needed"""
+
+    entry = nuclides.get(name)
+    if entry is None and not nuclideList:
+        registerFissionProducts()
+        entry = nuclides.get(name)
+    if entry is None:
+        entry = _addNuclide(name)
+    return entry
+
+def _addNuclide(name):
+    entry = Nuclide(name, len(nuclideList))
+    nuclides[name] = entry
+    nuclideList.append(entry)
+    nuclidesUpper.setdefault(name.upper(), []).append(entry)
+    return entry
+
+
+class Isotope(object):
     """
     Create new instance of an isotope
 
     Attributes:
+      nuclide = shared Nuclide instance for the isotope name
       element = atomic symbol, e.g. Am
       Z = atomic number
       A = mass number
@@ -25,22 +115,24 @@ class Isotope():
       isFissile() = determine if fissile
     """
 
-    def __init__(self, name, mass=0.0):
-        # Parse isotope name
-        m = re.match("([a-zA-Z]+)(\d+)([a-z])*",name)
+    __slots__ = ["nuclide", "mass"]
 
-        # Set isotope attributes
-        self.element = m.groups()[0]
-        self.Z = ElementToZ[self.element.upper()]
-        self.A = eval(m.groups()[1])
-        self.meta = True if m.groups()[2] == "m" else False
+    def __init__(self, name, mass=0.0):
+        self.nuclide = nuclides.get(name) or nuclide(name)
         self.mass = mass
 
+    def __reduce__(self):
+        return (Isotope, (self.nuclide.name, self.mass))
+
+    element = property(lambda self: self.nuclide.element)
+    Z = property(lambda self: self.nuclide.Z)
+    A = property(lambda self: self.nuclide.A)
+    meta = property(lambda self: self.nuclide.meta)
+
     def __str__(self):
         """Return string with isotope, e.g. Te129m"""
 
-        return "{0}{1}{2}".format(self.element, self.A,
-                                  "m" if self.meta else "")
+        return self.nuclide.label
 
     def __repr__(self):
         return "<Isotope: {0}, {1} kg>".format(str(self),self.mass)
@@ -48,7 +140,7 @@ class Isotope():
     def origenID(self):
         """Returns the ORIGEN integer identifier ZZAAAM"""
 
-        return 10000*self.Z + 10*self.A + (1 if self.meta else 0)
+        return self.nuclide.zzaaam
 
     def isActinide(self):
         """
@@ -56,12 +148,7 @@ class Isotope():
         boolean
         """
 
-        # We define an actinide as any isotope with Z >= 90
-        if self.Z >= 90:
-            return True
-        else:
-            return False
-        
+        return self.nuclide.actinide
 
     def isMinorActinide(self):
         """
@@ -69,12 +156,7 @@ class Isotope():
         boolean
         """
 
-        # We define a minor actinide as any actinide above Th-232
-        # excluding any isotopes of U and Pu
-        if self.Z >= 90 and self.Z != 92 and self.Z != 94:
-            if self.A >= 232:
-                return True
-        return False
+        return self.nuclide.minorActinide
 
     def isFissile(self):
         """
@@ -85,17 +167,45 @@ class Isotope():
         Cm243, Cm245, Cm247, Cf249, and Cf251.
         """
 
-        if self.__str__().upper() in fissileIsotopes:
-            return True
-        else:
-            return False
+        return self.nuclide.fissile
+
+class IsotopeView(Isotope):
+    """
+    Isotope whose mass is stored in the masses array of an owner, e.g.
+    a material.IsotopeArray, at the index of its nuclide. Setting the
+    mass writes through to the array and calls owner.invalidate().
+    """
+
+    __slots__ = ["owner"]
+
+    def __init__(self, nuclide, owner):
+        self.nuclide = nuclide
+        self.owner = owner
+
+    def _getMass(self):
+        return float(self.owner.masses[self.nuclide.index])
+
+    def _setMass(self, mass):
+        self.owner.masses[self.nuclide.index] = mass
+        self.owner.invalidate()
+
+    mass = property(_getMass, _setMass)
+
+    def __reduce__(self):
+        return (Isotope, (self.nuclide.name, self.mass))
+
 
 class FissionProduct(object):
-    
+
+    __slots__ = ["name", "mass"]
+
     def __init__(self, name, mass=0.0):
         self.name = name
         self.mass = mass
 
+    def __reduce__(self):
+        return (FissionProduct, (self.name, self.mass))
+
     def __str__(self):
         """Return string with isotope, e.g. Te129m"""
         return self.name
@@ -128,3 +238,10 @@ ElementToZ = {"H":   1, "HE":  2, "LI":  3, "BE":  4, "B":   5,
               "CM": 96, "BK": 97, "CF": 98, "ES": 99, "FM": 100,
               "MD": 101,"NO": 102,"LR": 103,"RF": 104,"DB": 105,
               "SG": 106,"BH": 107,"HS": 108,"MT": 109}
+
+def registerFissionProducts():
+    """Add the fission products of the pf yield table to the registry"""
+
+    for name in nuclearData().table("pf")[1]:
+        if name not in nuclides:
+            _addNuclide(name)
@@ -4,10 +4,50 @@
 Class definition for a material
 """
 
-from isotope import Isotope, FissionProduct
-import parameters
+from collections import MutableMapping
+from functools import wraps
+import inspect
+
+from isotope import Isotope, IsotopeView, FissionProduct, nuclide, nuclides, \
+    nuclideList, nuclidesUpper
+from nucleardata import nuclearData
 import math
 
+def nuclideData(name, library=None):
+    """
+    Return the list of nuclear data of the isotope 'name' in the nuclear
+    data library 'library', or None
+    """
+
+    if library is not None:
+        return nuclearData(library).row(name)
+    entry = nuclides.get(name)
+    return None if entry is None else entry.data
+
+def memoized(method):
+    """
+    Decorate a Material method so that its result is kept in the
+    material's memo for each set of arguments until the composition or
+    reaction rates of the material change.
+    """
+
+    spec = inspect.getargspec(method)
+    names = spec.args[1:]
+    defaults = dict(zip(names[len(names) - len(spec.defaults or ()):],
+                        spec.defaults or ()))
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        values = dict(defaults)
+        values.update(zip(names, args))
+        values.update(kwargs)
+        key = (method.__name__,) + tuple([values[name] for name in names])
+        memo = self.__dict__.setdefault("_memo", {})
+        if key not in memo:
+            memo[key] = method(self, *args, **kwargs)
+        return memo[key]
+    return wrapper
+
 class Material():
     """
     Create new instance of a material
@@ -20,6 +60,25 @@ class Material():
       diffRate = diffusion coefficient * flux
       flux = total flux
       power = 
+
+      If Material.compactStorage is True, isotopes becomes an
+      IsotopeArray storing the masses in one vector over the nuclide
+      registry when the fission products are expanded. addMass, mass,
+      find and iteration then work on the vector directly.
+
+      Fission products added as sfp* pseudo-isotopes are only expanded
+      with the pf yields when isotopes is first accessed, directly or
+      through find, iteration or a metric. composition() and
+      fissionProducts() do not expand them.
+
+      The metrics depending on nuclear data and expandFPs take the name
+      of a library registered with nucleardata.registerLibrary, by
+      default the one of parameters.py.
+
+      The masses, SQ, rates and critical mass are memoized until
+      addMass or expandFPs is called or a reaction rate is set. Call
+      invalidate() after changing the mass of an Isotope directly,
+      unless the isotopes are an IsotopeArray.
       
     Methods:
       mass() = mass of the material
@@ -31,6 +90,10 @@ class Material():
       externalDose() = external dose rate in Sv/hr at 1 meter
       criticalMass() = critical mass of bare sphere in kg
       addMass() = add mass of a specified isotope
+      expandFPs() = replace fission products by their daughters
+      compact() = store the isotopes in an IsotopeArray
+      composition() = vector of masses over the nuclide registry
+      invalidate() = forget memoized quantities
 
       bathke1()
       bathke2()
@@ -41,8 +104,15 @@ class Material():
       charlton5()
     """
 
+    # Store the isotopes in an IsotopeArray once expanded
+    compactStorage = False
+
+    # Attributes that memoized quantities depend on
+    rateAttributes = ["volume", "nuFissionRate", "absorptionRate",
+                      "diffRate", "flux", "power", "dpa"]
+
     def __init__(self):
-        self.isotopes = {}
+        self._setIsotopes({}, order=[])
         self.volume = None
         self.nuFissionRate = None
         self.absorptionRate = None
@@ -51,53 +121,141 @@ class Material():
         self.power = None
         self.dpa = None
 
+    def __getattr__(self, name):
+        # Only called for isotopes while fission products are pending
+        if name != "isotopes" or "_isotopes" not in self.__dict__:
+            raise AttributeError(name)
+        self.expandFPs()
+        return self.__dict__["isotopes"]
+
+    def __setattr__(self, name, value):
+        if name == "isotopes":
+            self._setIsotopes(value, pending=True)
+            return
+        if name in self.rateAttributes:
+            self.invalidate()
+        self.__dict__[name] = value
+
+    def __getstate__(self):
+        # The isotopes are pickled as (name, isotope) pairs, in the order
+        # they were added while that is known, so that the unpickled
+        # dictionary iterates, and its masses are summed, in the same
+        # order
+        state = self.__dict__.copy()
+        state.pop("_memo", None)
+        state.pop("isotopes", None)
+        order = state.pop("_order", None)
+        isotopes = self._isotopes
+        if isinstance(isotopes, dict):
+            if order is None:
+                isotopes = isotopes.items()
+            else:
+                isotopes = [(name, isotopes[name]) for name in order]
+        state["_isotopes"] = isotopes
+        state["_pending"] = "isotopes" not in self.__dict__
+        return state
+
+    def __setstate__(self, state):
+        state = dict(state)
+        isotopes = state.pop("_isotopes")
+        pending = state.pop("_pending")
+        order = None
+        if isinstance(isotopes, list):
+            order = [name for name, iso in isotopes]
+            isotopes = dict(isotopes)
+        self.__dict__.update(state)
+        self._setIsotopes(isotopes, pending, order)
+
+    def _setIsotopes(self, isotopes, pending=False, order=None):
+        # The isotopes are always in _isotopes, and also in isotopes
+        # unless fission products are waiting to be expanded. _order
+        # lists the names in the order they were added to the
+        # dictionary, or is None if that is not known.
+        self.invalidate()
+        if isinstance(isotopes, IsotopeArray):
+            isotopes.material = self
+        self.__dict__["_isotopes"] = isotopes
+        self.__dict__["_order"] = order
+        if pending:
+            self.__dict__.pop("isotopes", None)
+        else:
+            self.__dict__["isotopes"] = isotopes
+
+    def invalidate(self):
+        """Forget the memoized quantities of the material"""
+
+        memo = self.__dict__.get("_memo")
+        if memo:
+            memo.clear()
+
     def addMass(self, name, mass, FP=False):
         """Check if selected isotope is already in list. If so, add
         mass. Otherwise, create new Isotope and add to list
         """
 
-        if name in self.isotopes:
-            self.isotopes[name].mass += mass
+        self.invalidate()
+        isotopes = self._isotopes
+        if isinstance(isotopes, IsotopeArray) and not FP:
+            isotopes.addMass(name, mass)
+        elif name in isotopes:
+            isotopes[name].mass += mass
         else:
+            order = self.__dict__.get("_order")
+            if order is not None:
+                order.append(name)
             if FP:
-                self.isotopes[name] = FissionProduct(name, mass)
+                isotopes[name] = FissionProduct(name, mass)
+                self.__dict__.pop("isotopes", None)
             else:
-                self.isotopes[name] = Isotope(name, mass)
+                isotopes[name] = Isotope(name, mass)
 
     def __iter__(self):
         for iso in self.isotopes.values():
             yield iso
 
-    def expandFPs(self):
-        for fp in self.fissionProducts():
-            # Record name/mass and delete FP
-            name = fp.name
-            original_mass = fp.mass
-            del self.isotopes[name]
-
-            # Expand into isotopes
-            name = name[3:].upper()
-            if name == "AM242":
-                name = "AM242M"
-            for nrow, row in enumerate(parameters.pf):
-                if nrow == 0:
-                    # Determine which column to use
-                    column = row.index(name)
-                    continue
-                if nrow > 0:
-                    name = row[0]
-                    fraction = row[column]
-                    mass = original_mass*fraction
-                    #if name == "Cs133":
-		      #print(name,original_mass,fraction,fp.name)
-		      #raw_input('Press ENTER to continue...\n')
-                self.addMass(name, mass)
+    def expandFPs(self, yields="pf", library=None):
+        """
+        Replace the fission products by their daughters using the yield
+        table 'yields', "pf" or "sfp", of the nuclear data library
+        'library'. If the material was expanded with another table, its
+        fission products are put back and expanded again, undoing any
+        change made to their daughters since.
+        """
+
+        yieldMatrix(yields, library).expand([self])
+
+    def compact(self):
+        """Store the isotopes of the material in an IsotopeArray"""
+
+        if not isinstance(self._isotopes, IsotopeArray):
+            self._setIsotopes(IsotopeArray(self._isotopes),
+                              "isotopes" not in self.__dict__)
+
+    def composition(self):
+        """
+        Return an array of the masses of the isotopes in kg indexed by
+        Nuclide.index, with one entry for every nuclide in the registry.
+        Fission products are not included.
+        """
+
+        import numpy as np
+
+        isotopes = self._isotopes
+        if isinstance(isotopes, IsotopeArray):
+            isotopes._grow()
+            return isotopes.masses.copy()
+        vector = np.zeros(len(nuclideList))
+        for name, iso in isotopes.items():
+            if not isinstance(iso, FissionProduct):
+                vector[nuclide(name).index] = iso.mass
+        return vector
 
     def fissionProducts(self):
-        for iso in self.isotopes.values():
+        for iso in self._isotopes.values():
             if type(iso) == FissionProduct:
                 yield iso
 
+    @memoized
     def mass(self, Actinide = False, Fissile = False):
         """
         Return the total mass of the material in kg
@@ -109,6 +267,9 @@ class Material():
         are fissile
         """
 
+        if isinstance(self.isotopes, IsotopeArray):
+            return self.isotopes.total(Actinide, Fissile)
+
         total_mass = 0
         for isotope in self.isotopes.values():
             if Actinide and not isotope.isActinide():
@@ -118,6 +279,7 @@ class Material():
             total_mass += isotope.mass
         return total_mass
 
+    @memoized
     def SQ(self):
         """
         Return the number of 'significant quantities' (SQs) in the
@@ -142,45 +304,55 @@ class Material():
         If match found, return that Isotope. Otherwise return None.
         """
 
+        if isinstance(self.isotopes, IsotopeArray):
+            return self.isotopes.find(str(isotope))
+
         for key in self.isotopes:
             if str(isotope).upper() == key.upper():
                 return self.isotopes[key]
         return None
 
-    def heat(self, MA = True):
+    @memoized
+    def heat(self, MA = True, library = None):
         """Return the heat content of the material in W"""
 
         rate = 0.0
         for key in self.isotopes:
-            if key.upper() in parameters.data:
+            data = nuclideData(key, library)
+            if data is not None:
                 isotope = self.isotopes[key]
                 if not MA or isotope.isMinorActinide():
-                    rate += isotope.mass * parameters.data[key.upper()][0]
+                    rate += isotope.mass * data[0]
         return rate
 
-    def gammaHeat(self, MA = True):
+    @memoized
+    def gammaHeat(self, MA = True, library = None):
         """Return the heat content of the material due to photons in W"""
 
         rate = 0.0
         for key in self.isotopes:
-            if key.upper() in parameters.data:
+            data = nuclideData(key, library)
+            if data is not None:
                 isotope = self.isotopes[key]
                 if not MA or isotope.isMinorActinide():
-                    rate += isotope.mass * parameters.data[key.upper()][1]
+                    rate += isotope.mass * data[1]
         return rate
 
-    def neutronProduction(self, MA = True):
+    @memoized
+    def neutronProduction(self, MA = True, library = None):
         """Return the neutron production rate of the material in N/s"""
 
         rate = 0.0
         for key in self.isotopes:
-            if key.upper() in parameters.data:
+            data = nuclideData(key, library)
+            if data is not None:
                 isotope = self.isotopes[key]
                 if not MA or isotope.isMinorActinide():
-                    rate += isotope.mass * parameters.data[key.upper()][2]
+                    rate += isotope.mass * data[2]
         return rate
 
-    def externalDose(self, MA = True):
+    @memoized
+    def externalDose(self, MA = True, library = None):
         """
         Return the external dose rate of the material in Sv/hr at
         1-meter
@@ -188,12 +360,14 @@ class Material():
 
         rate = 0.0
         for key in self.isotopes:
-            if key.upper() in parameters.data:
+            data = nuclideData(key, library)
+            if data is not None:
                 isotope = self.isotopes[key]
                 if not MA or isotope.isMinorActinide():
-                    rate += isotope.mass * parameters.data[key.upper()][3]
+                    rate += isotope.mass * data[3]
         return rate
 
+    @memoized
     def criticalMass(self):
         """
         Returns the critical mass of bare sphere of the material 
@@ -236,30 +410,34 @@ class Material():
 	   intpower = 0.
 	return intpower
 
-    def radiotoxing(self, MA = True):
+    @memoized
+    def radiotoxing(self, MA = True, library = None):
         """Return the neutron production rate of the material in N/s"""
 
         rate = 0.0
         for key in self.isotopes:
-            if key.upper() in parameters.data:
+            data = nuclideData(key, library)
+            if data is not None:
                 isotope = self.isotopes[key]
                 if not MA or isotope.isMinorActinide():
-                    rate += isotope.mass * parameters.data[key.upper()][4]
+                    rate += isotope.mass * data[4]
         return rate
        
-    def radiotoxinh(self, MA = True):
+    @memoized
+    def radiotoxinh(self, MA = True, library = None):
         """Return the neutron production rate of the material in N/s"""
 
         rate = 0.0
         for key in self.isotopes:
-            if key.upper() in parameters.data:
+            data = nuclideData(key, library)
+            if data is not None:
                 isotope = self.isotopes[key]
                 if not MA or isotope.isMinorActinide():
-                    rate += isotope.mass * parameters.data[key.upper()][5]
+                    rate += isotope.mass * data[5]
         return rate
 
         
-    def bathke1(self, Dose = False):
+    def bathke1(self, Dose = False, library = None):
         """
         Returns the first metric in the GLOBAL '09 paper, The
         Attractiveness of Materials in Advanced Nuclear Fuel Cycles
@@ -269,17 +447,16 @@ class Material():
         M = self.criticalMass()
         if not M:
             return None
-        h = self.heat(True)/self.mass()
+        h = self.heat(True, library)/self.mass()
         # Convert dose to rad (assume 1 rad = 1 rem)
         if not Dose:
-            D = 0.2 * 100 * self.externalDose()
+            D = 0.2 * 100 * self.externalDose(library=library)
         else:
             D = 0.
-        print (M,h,D)
         return 1.0 - math.log10(M/800.0 + M*h/4500.0 + M/50.0 * 
                                 (D/500.0)**(1.0/math.log10(2.0)))
 
-    def bathke2(self, Dose = False):
+    def bathke2(self, Dose = False, library = None):
         """
         Returns the second metric in the GLOBAL '09 paper, The
         Attractiveness of Materials in Advanced Nuclear Fuel Cycles
@@ -289,11 +466,11 @@ class Material():
         M = self.criticalMass()
         if not M:
             return None
-        h = self.heat()/self.mass()
-        S = self.neutronProduction()/self.mass()
+        h = self.heat(library=library)/self.mass()
+        S = self.neutronProduction(library=library)/self.mass()
         # Convert dose to rad (assume 1 rad = 1 rem)
         if not Dose:
-            D = 0.2 * 100 * self.externalDose()
+            D = 0.2 * 100 * self.externalDose(library=library)
         else:
             D = 0.
         return 1.0 - math.log10(M/800.0 + M*h/4500.0 + M*S/6.8e6 + 
@@ -339,7 +516,7 @@ class Material():
         # Choose lowest category
         return min(u,u_)
 
-    def charlton2(self):
+    def charlton2(self, library = None):
         """
         Determine u_2 from Charlton et al.
         """
@@ -347,10 +524,11 @@ class Material():
         rate = 0.0
         mass = 0.0
         for key in self.isotopes:
-            if key.upper() in parameters.data:
+            data = nuclideData(key, library)
+            if data is not None:
                 isotope = self.isotopes[key]
                 if isotope.Z == 94:
-                    rate += isotope.mass * parameters.data[key.upper()][0]
+                    rate += isotope.mass * data[0]
                     mass += isotope.mass
         x = rate/mass
         return 1 - math.exp(-3.0*(x/570.0)**0.8)
@@ -384,12 +562,12 @@ class Material():
         else:
             return math.exp(-2.5*(x/125.0))
 
-    def charlton5(self):
+    def charlton5(self, library = None):
         """
         Determine u_5 from Charlton et al.
         """
 
-        x = 100 * self.externalDose() / self.SQ()
+        x = 100 * self.externalDose(library=library) / self.SQ()
         if x <= 0.2:
             return 0
         elif x > 0.2 and x <= 5:
@@ -401,11 +579,11 @@ class Material():
         else:
             return 1
 
-    def mohit7(self):
+    def mohit7(self, library = None):
 	"""
 	Determine u7 from Mohit
 	"""
-	x = self.neutronProduction() 
+	x = self.neutronProduction(library=library)
 	if  x <= 1e4:
 	    return 1
 	elif x>1e4 and x<=1e6:
@@ -415,11 +593,11 @@ class Material():
 	else:
 	    return 0
 	    
-    def mohit8(self):
+    def mohit8(self, library = None):
 	"""
 	Determine u8 from Mohit
 	"""
-	x = self.radiotoxinh()
+	x = self.radiotoxinh(library=library)
 	if x<=5e12:
 	   return 1
 	elif x>5e12 and x<5e13:
@@ -427,11 +605,11 @@ class Material():
 	else:
 	   return 0
      
-    def mohit9(self):
+    def mohit9(self, library = None):
 	"""
 	Determine u9 from Mohit
 	"""
-	x = self.radiotoxing()
+	x = self.radiotoxing(library=library)
 	if x<=1e10:
 	   return 1
 	elif x>1e10 and x<1e11:
@@ -440,14 +618,372 @@ class Material():
 	   return 0
      
      
-    def mohit12(self):
+    def mohit12(self, library = None):
 	"""
 	Determine u12 from Mohit
 	"""
-	x = self.heat() / self.mass()
+	x = self.heat(library=library) / self.mass()
 	if x<=50:
 	   return 1
 	elif x>50 and x<400:
 	   return -0.0029*x+1.1429
 	else:
 	   return 0
+
+
+class IsotopeArray(MutableMapping):
+    """
+    Dictionary of the form {name: <Isotope instance>} for the isotopes
+    of a material that stores their masses in a numpy array over the
+    nuclide registry index instead of one Isotope object each. Isotopes
+    are returned as IsotopeView instances created when accessed, so
+    changing their mass changes the array. Fission products (sfp*
+    pseudo-isotopes) are kept as FissionProduct instances.
+
+    Attributes:
+      masses = array of masses indexed by Nuclide.index
+      present = boolean array marking the isotopes in the material
+      fissionProducts = dictionary of the form {name: <FissionProduct>}
+      material = Material holding the array, whose memoized quantities
+                 are forgotten when a mass is changed through the array
+    """
+
+    def __init__(self, isotopes=None):
+        import numpy as np
+
+        self.masses = np.zeros(len(nuclideList))
+        self.present = np.zeros(len(nuclideList), dtype=bool)
+        self.fissionProducts = {}
+        self.material = None
+        if isotopes:
+            indices = []
+            masses = []
+            for name, iso in isotopes.items():
+                if isinstance(iso, FissionProduct):
+                    self.fissionProducts[name] = iso
+                else:
+                    indices.append(nuclide(name).index)
+                    masses.append(iso.mass)
+            self._grow()
+            self.masses[indices] = masses
+            self.present[indices] = True
+
+    def _grow(self):
+        import numpy as np
+
+        # Make room for nuclides added to the registry since creation
+        n = len(nuclideList) - len(self.masses)
+        if n > 0:
+            self.masses = np.concatenate([self.masses, np.zeros(n)])
+            self.present = np.concatenate([self.present,
+                                           np.zeros(n, dtype=bool)])
+
+    def invalidate(self):
+        """Forget the memoized quantities of the material"""
+
+        if self.material is not None:
+            self.material.invalidate()
+
+    def __getitem__(self, name):
+        entry = nuclides.get(name)
+        if entry and entry.index < len(self.present) and \
+                self.present[entry.index]:
+            return IsotopeView(entry, self)
+        return self.fissionProducts[name]
+
+    def __setitem__(self, name, iso):
+        self.invalidate()
+        if isinstance(iso, FissionProduct):
+            self.fissionProducts[name] = iso
+            return
+        index = nuclide(name).index
+        if index >= len(self.masses):
+            self._grow()
+        self.masses[index] = iso.mass
+        self.present[index] = True
+
+    def __delitem__(self, name):
+        self.invalidate()
+        if name in self.fissionProducts:
+            del self.fissionProducts[name]
+            return
+        entry = nuclides.get(name)
+        if not entry or entry.index >= len(self.present) or \
+                not self.present[entry.index]:
+            raise KeyError(name)
+        self.masses[entry.index] = 0.0
+        self.present[entry.index] = False
+
+    def __contains__(self, name):
+        if name in self.fissionProducts:
+            return True
+        entry = nuclides.get(name)
+        return bool(entry and entry.index < len(self.present) and
+                    self.present[entry.index])
+
+    def __iter__(self):
+        import numpy as np
+
+        for index in np.flatnonzero(self.present):
+            yield nuclideList[index].name
+        for name in self.fissionProducts:
+            yield name
+
+    def __len__(self):
+        return int(self.present.sum()) + len(self.fissionProducts)
+
+    def __getstate__(self):
+        # Registry indices depend on the order nuclides were added in
+        # each process, so the masses are pickled by name
+        return {"isotopes": [(name, self[name].mass) for name in self
+                             if name not in self.fissionProducts],
+                "fissionProducts": self.fissionProducts.items()}
+
+    def __setstate__(self, state):
+        self.__init__()
+        indices = [nuclide(name).index for name, mass in state["isotopes"]]
+        self._grow()
+        self.masses[indices] = [mass for name, mass in state["isotopes"]]
+        self.present[indices] = True
+        self.fissionProducts = dict(state["fissionProducts"])
+
+    def addMass(self, name, mass):
+        """Add mass to the isotope 'name', adding it if not present"""
+
+        index = nuclide(name).index
+        if index >= len(self.masses):
+            self._grow()
+        self.masses[index] += mass
+        self.present[index] = True
+
+    def total(self, Actinide=False, Fissile=False):
+        """
+        Return the total mass in kg, optionally of the actinides or the
+        fissile isotopes only, as in Material.mass
+        """
+
+        self._grow()
+        if not (Actinide or Fissile):
+            return (float(self.masses.sum()) +
+                    sum([fp.mass for fp in self.fissionProducts.values()]))
+        mask = self.present.copy()
+        if Actinide:
+            mask &= nuclideMasks()["actinide"]
+        if Fissile:
+            mask &= nuclideMasks()["fissile"]
+        return float(self.masses[mask].sum())
+
+    def find(self, name):
+        """
+        Return the isotope whose name matches 'name' regardless of case,
+        or None.
+        """
+
+        for entry in nuclidesUpper.get(name.upper(), []):
+            if entry.index < len(self.present) and self.present[entry.index]:
+                return IsotopeView(entry, self)
+        for key in self.fissionProducts:
+            if key.upper() == name.upper():
+                return self.fissionProducts[key]
+        return None
+
+
+class YieldMatrix(object):
+    """
+    Fission product yields of a table of the nuclear data, with
+    one column per parent and one row per daughter, that expands the
+    fission products of many materials at once. The daughter masses of
+    a batch are updated one parent column at a time, in the order the
+    fission products are stored in each material, so the result is
+    bitwise identical to adding each daughter with Material.addMass.
+
+    The fission products and the daughters present before expansion
+    are recorded in each material, so that expanding it with another
+    table first puts them back.
+
+    Attributes:
+      key = (library, yields) the table comes from
+      parents = names of the parents heading the columns, e.g. AM242M
+      daughters = names of the daughters, each listed once
+      indices = registry indices of the daughters
+      rows = for each column, the daughter rows with a nonzero yield
+      fractions = for each column, the nonzero yields
+
+    Methods:
+      column(name) = column of the sfp* pseudo-isotope 'name'
+      expand(materials) = expand the fission products of the materials
+    """
+
+    def __init__(self, parents, daughters, matrix, key=None):
+        import numpy as np
+
+        # The yields of a daughter listed on several rows are summed
+        # into the row of its first occurrence
+        rows = {}
+        for name in daughters:
+            rows.setdefault(name, len(rows))
+        if len(rows) < len(daughters):
+            merged = np.zeros((len(rows), matrix.shape[1]))
+            np.add.at(merged, [rows[name] for name in daughters], matrix)
+            daughters = sorted(rows, key=rows.get)
+            matrix = merged
+
+        self.key = key
+        self.parents = parents
+        self.daughters = daughters
+        self.indices = np.array([nuclide(name).index
+                                 for name in self.daughters])
+        self.rows = []
+        self.fractions = []
+        for j in range(len(self.parents)):
+            rows = np.flatnonzero(matrix[:,j])
+            self.rows.append(rows)
+            self.fractions.append(matrix[rows,j])
+
+    def column(self, name):
+        """Return the column of the sfp* pseudo-isotope 'name'"""
+
+        name = name[3:].upper()
+        if name == "AM242":
+            name = "AM242M"
+        return self.parents.index(name)
+
+    def expand(self, materials):
+        """
+        Replace the fission products of every material in 'materials'
+        by their daughters
+        """
+
+        import numpy as np
+
+        # Group materials by the order of their fission products
+        groups = {}
+        for material in materials:
+            material.invalidate()
+            record = material.__dict__.get("_expansion")
+            if record is not None and record[0] != self.key:
+                lumps = self._restore(material, record)
+            else:
+                lumps = [(fp.name, fp.mass)
+                         for fp in material.fissionProducts()]
+            if lumps:
+                names, masses = zip(*lumps)
+                groups.setdefault(names, []).append((material, masses))
+
+        for names, entries in groups.items():
+            parents = np.array([masses for material, masses in entries])
+            current = [self._masses(material) for material, masses in entries]
+            daughters = np.array([masses for masses, base in current])
+            for k, name in enumerate(names):
+                j = self.column(name)
+                daughters[:,self.rows[j]] += (parents[:,k,None] *
+                                              self.fractions[j])
+            for (material, masses), row, (before, base) in zip(
+                    entries, daughters, current):
+                self._store(material, names, row)
+                material._expansion = (self.key, zip(names, masses), base)
+
+        for material in materials:
+            material._setIsotopes(material._isotopes)
+            if material.compactStorage:
+                material.compact()
+
+    def _masses(self, material):
+        import numpy as np
+
+        # Current masses of the daughters in a material, and those of
+        # the daughters present by name
+        isotopes = material._isotopes
+        if isinstance(isotopes, IsotopeArray):
+            isotopes._grow()
+            masses = isotopes.masses[self.indices]
+            present = np.flatnonzero(isotopes.present[self.indices])
+            return masses, dict((self.daughters[i], float(masses[i]))
+                                for i in present)
+        masses = []
+        base = {}
+        for name in self.daughters:
+            iso = isotopes.get(name)
+            if iso is None:
+                masses.append(0.0)
+            else:
+                masses.append(iso.mass)
+                base[name] = iso.mass
+        return masses, base
+
+    def _restore(self, material, record):
+        # Put back the fission products and the daughters as they were
+        # before an expansion with another table, returning the fission
+        # products in their original order
+        key, lumps, base = record
+        isotopes = material._isotopes
+        for name in yieldMatrix(key[1], key[0]).daughters:
+            if name in base:
+                isotopes[name].mass = base[name]
+            elif name in isotopes:
+                del isotopes[name]
+        for name, mass in lumps:
+            isotopes[name] = FissionProduct(name, mass)
+        return lumps
+
+    def _store(self, material, names, masses):
+        # Replace the fission products 'names' by the daughter masses,
+        # changing the isotopes in the same order as Material.addMass
+        isotopes = material._isotopes
+        if isinstance(isotopes, IsotopeArray):
+            for name in names:
+                del isotopes.fissionProducts[name]
+            isotopes.masses[self.indices] = masses
+            isotopes.present[self.indices] = True
+            return
+        del isotopes[names[0]]
+        for name, mass in zip(self.daughters, masses.tolist()):
+            iso = isotopes.get(name)
+            if iso is None:
+                isotopes[name] = Isotope(name, mass)
+            else:
+                iso.mass = mass
+        for name in names[1:]:
+            del isotopes[name]
+        material.invalidate()
+
+def yieldMatrix(yields="pf", library=None):
+    """
+    Return the YieldMatrix of the yield table 'yields', "pf" or "sfp",
+    of the nuclear data library 'library'
+    """
+
+    data = nuclearData(library)
+    return data.cached(("yields", yields), lambda: YieldMatrix(
+            *data.table(yields), key=(data.name, yields)))
+
+def expandMaterials(materials, yields="pf", library=None):
+    """
+    Expand the fission products of every material in 'materials' with
+    the yield table 'yields', "pf" or "sfp", of the nuclear data library
+    'library'
+    """
+
+    yieldMatrix(yields, library).expand(materials)
+
+
+_masks = {}
+
+def nuclideMasks():
+    """
+    Return a dictionary of arrays over the nuclide registry index: the
+    boolean masks actinide, minorActinide and fissile, and Z and A.
+    """
+
+    import numpy as np
+
+    if _masks.get("size") != len(nuclideList):
+        _masks.clear()
+        _masks["size"] = len(nuclideList)
+        for name in ["actinide", "minorActinide", "fissile"]:
+            _masks[name] = np.array([getattr(entry, name) for entry
+                                     in nuclideList], dtype=bool)
+        for name in ["Z", "A"]:
+            _masks[name] = np.array([getattr(entry, name) for entry
+                                     in nuclideList], dtype=int)
+    return _masks
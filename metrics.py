@@ -0,0 +1,386 @@
+#!/usr/bin/env python
+
+"""
+Batched evaluation of the properties of many materials at once. The
+compositions of the materials are stacked in a matrix over the nuclide
+registry and multiplied by the coefficients of the nuclear data, so the
+heat, photon heat, neutron production, external dose and radiotoxicity
+of every material are one matrix product.
+
+Fission products that have not been expanded (sfp* pseudo-isotopes) are
+counted through folded coefficients, the yield-weighted sums of the
+coefficients of their daughters, so materials loaded with
+loadData(expand=False) can be evaluated without expanding them.
+
+Every function depending on nuclear data takes the name of a library
+registered with nucleardata.registerLibrary; the matrices are compiled
+once per library and cached with it.
+
+The proliferation resistance metrics of Material (criticalMass,
+bathke1/2, charlton1-5 and mohit7/8/9/12) are available as functions of
+arrays of the quantities they are computed from, giving the same values
+elementwise. Where the Material method would return None or divide by
+zero, the result is NaN.
+"""
+
+from __future__ import division, print_function
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+from isotope import nuclideList, nuclide
+from material import nuclideMasks, yieldMatrix
+from nucleardata import nuclearData
+
+# Columns of the nuclear data, named after the Material methods
+propertyNames = ["heat", "gammaHeat", "neutronProduction", "externalDose",
+                 "radiotoxing", "radiotoxinh"]
+
+# Masses summed over groups of nuclides by the metrics
+groupNames = ["massPu", "massPuData", "heatPu", "evenPu", "massPuU233",
+              "massU235", "massNp237", "massU"]
+
+def coefficientMatrix(library=None):
+    """
+    Return a pair of arrays of shape (nuclides, 6) with the row of the
+    nuclear data library 'library' for each nuclide in the registry, or
+    zeros for nuclides without data, for all nuclides and for minor
+    actinides only. Rebuilt when the registry grows.
+    """
+
+    data = nuclearData(library)
+    def build():
+        matrix = np.zeros((len(nuclideList), len(propertyNames)))
+        for entry in nuclideList:
+            row = data.row(entry.name)
+            if row is not None:
+                matrix[entry.index] = row
+        return matrix, matrix * nuclideMasks()["minorActinide"][:,None]
+    return data.cached(("coefficients", len(nuclideList)), build)
+
+def foldedCoefficients(yields="pf", library=None):
+    """
+    Return a pair of arrays of shape (parents, 6) with the properties
+    per kg of fission products of each parent column of the yield table
+    'yields' of the nuclear data library 'library', for all daughters
+    and for minor actinide daughters only.
+    """
+
+    def build():
+        table = yieldMatrix(yields, library)
+        folded = []
+        for coefficients in coefficientMatrix(library):
+            matrix = np.zeros((len(table.parents), len(propertyNames)))
+            for j, rows in enumerate(table.rows):
+                matrix[j] = np.dot(table.fractions[j],
+                                   coefficients[table.indices[rows]])
+            folded.append(matrix)
+        return tuple(folded)
+    return nuclearData(library).cached(("folded", yields, len(nuclideList)),
+                                       build)
+
+def foldedMasses(yields="pf", library=None):
+    """
+    Return an array with the mass of the daughters per kg of fission
+    products of each parent column of the yield table 'yields' of the
+    nuclear data library 'library'
+    """
+
+    table = yieldMatrix(yields, library)
+    return np.array([fractions.sum() for fractions in table.fractions])
+
+def groupMatrix(library=None):
+    """
+    Return an array of shape (nuclides, len(groupNames)) whose product
+    with a composition gives the group masses of groupNames: plutonium,
+    plutonium with nuclear data, heat of plutonium, even
+    plutonium isotopes, plutonium and U233, U235, Np237 and uranium.
+    """
+
+    u233, u235, np237 = [nuclide(name).index
+                         for name in ["U233", "U235", "Np237"]]
+    data = nuclearData(library)
+    def build():
+        masks = nuclideMasks()
+        known = np.array([data.row(entry.name) is not None
+                          for entry in nuclideList])
+        plutonium = masks["Z"] == 94
+        matrix = np.zeros((len(nuclideList), len(groupNames)))
+        matrix[:,0] = plutonium
+        matrix[:,1] = plutonium & known
+        matrix[:,2] = coefficientMatrix(library)[0][:,0] * plutonium
+        matrix[:,3] = plutonium & (masks["A"] % 2 == 0)
+        matrix[:,4] = plutonium
+        matrix[u233,4] = 1.0
+        matrix[u235,5] = 1.0
+        matrix[np237,6] = 1.0
+        matrix[:,7] = masks["Z"] == 92
+        return matrix
+    return data.cached(("groups", len(nuclideList)), build)
+
+def compositionMatrix(materials):
+    """
+    Return an array of shape (materials, nuclides) with the mass of
+    every nuclide of the registry in each material.
+    """
+
+    vectors = [material.composition() for material in materials]
+    matrix = np.zeros((len(vectors), len(nuclideList)))
+    for i, vector in enumerate(vectors):
+        matrix[i,:len(vector)] = vector
+    return matrix
+
+def fissionProductMatrix(materials, yields="pf", library=None):
+    """
+    Return an array of shape (materials, parents) with the mass of the
+    unexpanded fission products of each material in each parent column
+    of the yield table 'yields' of the nuclear data library 'library'.
+    """
+
+    table = yieldMatrix(yields, library)
+    matrix = np.zeros((len(materials), len(table.parents)))
+    for i, material in enumerate(materials):
+        for fp in material.fissionProducts():
+            matrix[i,table.column(fp.name)] += fp.mass
+    return matrix
+
+def properties(materials, compositions=None, fissionProducts=None,
+               yields="pf", library=None):
+    """
+    Return a pair of arrays of shape (materials, 6) with the properties
+    in propertyNames for each material in the list 'materials': one
+    for all isotopes, as Material.heat(False) etc., and one for the
+    minor actinides only, as Material.heat(True) etc. Unexpanded
+    fission products count as their daughters in the yield table
+    'yields'. The nuclear data are those of the library 'library'.
+
+    compositions and fissionProducts may be given as returned by
+    compositionMatrix and fissionProductMatrix to avoid building them
+    again.
+    """
+
+    if compositions is None:
+        compositions = compositionMatrix(materials)
+    if fissionProducts is None:
+        fissionProducts = fissionProductMatrix(materials, yields, library)
+    n = compositions.shape[1]
+    pairs = zip(coefficientMatrix(library), foldedCoefficients(yields, library))
+    return tuple([np.dot(compositions, coefficients[:n]) +
+                  np.dot(fissionProducts, folded)
+                  for coefficients, folded in pairs])
+
+def propertyTable(materials, yields="pf", compositions=None, library=None):
+    """
+    Return an ordered dictionary of arrays over the list 'materials'
+    with their mass and each property of propertyNames, for all
+    isotopes (e.g. "heat") and for minor actinides only (e.g.
+    "heatMA"). Unexpanded fission products count as their daughters in
+    the yield table 'yields' of the nuclear data library 'library'.
+    """
+
+    if compositions is None:
+        compositions = compositionMatrix(materials)
+    fissionProducts = fissionProductMatrix(materials, yields, library)
+    total, minorActinides = properties(materials, compositions,
+                                       fissionProducts, yields, library)
+    table = OrderedDict()
+    table["mass"] = (compositions.sum(axis=1) +
+                     np.dot(fissionProducts, foldedMasses(yields, library)))
+    for j, name in enumerate(propertyNames):
+        table[name] = total[:,j]
+        table[name + "MA"] = minorActinides[:,j]
+    return table
+
+def cycleMaterials(cycles):
+    """
+    Return the keys of the form (cycle index, (timenode, material)) and
+    the Material instances of every cycle in 'cycles', in the same
+    order.
+    """
+
+    keys = []
+    materials = []
+    for i, cycle in enumerate(cycles):
+        for key in sorted(cycle.materials):
+            keys.append((i, key))
+            materials.append(cycle.materials[key])
+    return keys, materials
+
+def cycleProperties(cycles, yields="pf", library=None):
+    """
+    Return the keys from cycleMaterials and the propertyTable of all the
+    materials of every cycle in 'cycles'.
+    """
+
+    keys, materials = cycleMaterials(cycles)
+    return keys, propertyTable(materials, yields, library=library)
+
+def metricInputs(materials, yields="pf", library=None):
+    """
+    Return an ordered dictionary of arrays over the list 'materials'
+    with everything the proliferation resistance metrics depend on: the
+    propertyTable, the group masses of groupNames, the number of
+    significant quantities SQ and the critical mass.
+    """
+
+    compositions = compositionMatrix(materials)
+    inputs = propertyTable(materials, yields, compositions, library)
+    groups = np.dot(compositions, groupMatrix(library)[:compositions.shape[1]])
+    for j, name in enumerate(groupNames):
+        inputs[name] = groups[:,j]
+    inputs["SQ"] = SQ(inputs["massPu"], inputs["massNp237"], inputs["massU"])
+
+    rates = dict((name, np.array([np.nan if getattr(m, name) is None
+                                  else getattr(m, name) for m in materials]))
+                 for name in ["nuFissionRate", "absorptionRate", "flux"])
+    inputs["criticalMass"] = criticalMass(rates["nuFissionRate"],
+                                          rates["absorptionRate"],
+                                          rates["flux"])
+    return inputs
+
+def proliferationMetrics(materials=None, inputs=None, Dose=False,
+                         yields="pf", library=None):
+    """
+    Return an ordered dictionary of arrays with every proliferation
+    resistance metric for the list 'materials', or for the arrays
+    'inputs' of the form returned by metricInputs. Dose is passed to
+    bathke1 and bathke2.
+    """
+
+    if inputs is None:
+        inputs = metricInputs(materials, yields, library)
+    mass = inputs["mass"]
+    metrics = OrderedDict()
+    metrics["criticalMass"] = inputs["criticalMass"]
+    metrics["bathke1"] = bathke1(inputs["criticalMass"], inputs["heatMA"],
+                                 mass, inputs["externalDoseMA"], Dose)
+    metrics["bathke2"] = bathke2(inputs["criticalMass"], inputs["heatMA"],
+                                 inputs["neutronProductionMA"], mass,
+                                 inputs["externalDoseMA"], Dose)
+    metrics["charlton1"] = charlton1(inputs["massPuU233"], inputs["massU235"])
+    metrics["charlton2"] = charlton2(inputs["heatPu"], inputs["massPuData"])
+    metrics["charlton3"] = charlton3(inputs["evenPu"], inputs["massPu"])
+    metrics["charlton4"] = charlton4(inputs["SQ"], mass)
+    metrics["charlton5"] = charlton5(inputs["externalDoseMA"], inputs["SQ"])
+    metrics["mohit7"] = mohit7(inputs["neutronProductionMA"])
+    metrics["mohit8"] = mohit8(inputs["radiotoxinhMA"])
+    metrics["mohit9"] = mohit9(inputs["radiotoxingMA"])
+    metrics["mohit12"] = mohit12(inputs["heatMA"], mass)
+    return metrics
+
+# Metric kernels over arrays, each matching the Material method of the
+# same name given the arrays of its quantities
+
+def SQ(massPu, massNp237, massU):
+    """Significant quantities from the Pu, Np237 and U masses"""
+
+    return massPu/8.0 + massNp237/25.0 + massU/75.0
+
+def criticalMass(nuFissionRate, absorptionRate, flux):
+    """Critical mass of a bare sphere in kg, NaN if not critical"""
+
+    with np.errstate(all="ignore"):
+        R = np.sqrt(math.pi**2 * (flux * 0.45)/
+                    (nuFissionRate - absorptionRate))
+        return np.where(nuFissionRate > absorptionRate,
+                        4./3. * math.pi * R**3 * 16. / 1000., np.nan)
+
+def bathke1(M, heat, mass, dose, Dose=False):
+    """First metric of Bathke et al. from the minor actinide heat/dose"""
+
+    with np.errstate(all="ignore"):
+        h = heat/mass
+        D = 0.2 * 100 * dose if not Dose else np.zeros(np.shape(dose))
+        u = 1.0 - np.log10(M/800.0 + M*h/4500.0 + M/50.0 *
+                           (D/500.0)**(1.0/math.log10(2.0)))
+    return np.where((M == 0) | (mass == 0), np.nan, u)
+
+def bathke2(M, heat, neutronProduction, mass, dose, Dose=False):
+    """Second metric of Bathke et al., adding the neutron source"""
+
+    with np.errstate(all="ignore"):
+        h = heat/mass
+        S = neutronProduction/mass
+        D = 0.2 * 100 * dose if not Dose else np.zeros(np.shape(dose))
+        u = 1.0 - np.log10(M/800.0 + M*h/4500.0 + M*S/6.8e6 +
+                           M/50.0 * (D/500.0)**(1.0/math.log10(2.0)))
+    return np.where((M == 0) | (mass == 0), np.nan, u)
+
+def charlton1(massPuU233, massU235):
+    """u_1 of Charlton et al. from the Pu+U233 and U235 categories"""
+
+    u = np.select([massPuU233 < 0.4,
+                   (massPuU233 >= 0.4) & (massPuU233 < 2),
+                   (massPuU233 >= 2) & (massPuU233 < 6)],
+                  [0.45, 0.35, 0.25], 0.15)
+    u_ = np.select([massU235 < 2,
+                    (massU235 >= 2) & (massU235 < 6),
+                    (massU235 >= 6) & (massU235 < 20)],
+                   [0.45, 0.35, 0.25], 0.15)
+    return np.minimum(u, u_)
+
+def charlton2(heatPu, massPu):
+    """u_2 of Charlton et al. from the heat per mass of plutonium"""
+
+    with np.errstate(all="ignore"):
+        x = heatPu/massPu
+        u = 1 - np.exp(-3.0*(x/570.0)**0.8)
+    return np.where(massPu == 0, np.nan, u)
+
+def charlton3(evenPu, massPu):
+    """u_3 of Charlton et al. from the even plutonium fraction"""
+
+    with np.errstate(all="ignore"):
+        x = np.where(massPu > 0, evenPu/massPu, 0.0)
+        return 1 - np.exp(-3.5*x**1.8)
+
+def charlton4(SQ, mass):
+    """u_4 of Charlton et al. from the significant quantities per tonne"""
+
+    with np.errstate(all="ignore"):
+        x = SQ / mass * 1000
+        u = np.where(x < 0.01, 1.0, np.exp(-2.5*(x/125.0)))
+    return np.where(mass == 0, np.nan, u)
+
+def charlton5(dose, SQ):
+    """u_5 of Charlton et al. from the dose per significant quantity"""
+
+    with np.errstate(all="ignore"):
+        x = 100 * dose / SQ
+        u = np.select([x <= 0.2, (x > 0.2) & (x <= 5),
+                       (x > 5) & (x <= 75), (x > 75) & (x <= 600)],
+                      [0.0, 0.0520833*x - 0.010416, 0.0035714*x + 0.232143,
+                       0.00095238*x + 0.428571], 1.0)
+    return np.where(SQ == 0, np.nan, u)
+
+def mohit7(neutronProduction):
+    """u7 of Mohit from the neutron production rate"""
+
+    x = neutronProduction
+    return np.select([x <= 1e4, (x > 1e4) & (x <= 1e6),
+                      (x > 1e6) & (x <= 1e14)],
+                     [1.0, -3e-7*x+0.8, -4e-15*x+0.5], 0.0)
+
+def mohit8(radiotoxinh):
+    """u8 of Mohit from the inhalation radiotoxicity"""
+
+    x = radiotoxinh
+    return np.select([x <= 5e12, (x > 5e12) & (x < 5e13)],
+                     [1.0, -2e-14*x+1.1111], 0.0)
+
+def mohit9(radiotoxing):
+    """u9 of Mohit from the ingestion radiotoxicity"""
+
+    x = radiotoxing
+    return np.select([x <= 1e10, (x > 1e10) & (x < 1e11)],
+                     [1.0, -1e-11*x+1.1111], 0.0)
+
+def mohit12(heat, mass):
+    """u12 of Mohit from the heat per mass"""
+
+    with np.errstate(all="ignore"):
+        x = heat / mass
+        u = np.select([x <= 50, (x > 50) & (x < 400)],
+                      [1.0, -0.0029*x+1.1429], 0.0)
+    return np.where(mass == 0, np.nan, u)
@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+
+"""
+Compiled nuclear data. The isotope data and fission product yield
+tables of parameters.py are compiled into parameters.npz, an
+uncompressed archive of arrays with an index of the names, which is
+read instead of importing parameters. The archive is compiled when the
+data is first used, not when a module is imported, and again when
+parameters.py is newer. Its arrays are only read when first used. If
+the archive cannot be written, the arrays are compiled in memory.
+
+Alternative libraries, files laid out like parameters.py or archives
+compiled from them, are added with registerLibrary and selected by name
+wherever nuclear data is used. Tables missing from a library are taken
+from the default library. Each library caches the matrices compiled
+from it by other modules.
+
+Run this module to compile the archive, optionally adding the yield
+table of an Excel workbook laid out like parameters.pf (e.g. PF.xls)
+as the table "xls":
+
+    python nucleardata.py [PF.xls]
+"""
+
+from __future__ import division, print_function
+import os
+import sys
+import tempfile
+import zipfile
+from collections import OrderedDict
+
+try:
+    import xlrd
+except ImportError:
+    xlrd = None
+
+# Increment whenever the layout of the compiled data changes
+dataVersion = 2
+
+directory = os.path.dirname(os.path.abspath(__file__))
+sourceFile = os.path.join(directory, "parameters.py")
+dataFile = os.path.join(directory, "parameters.npz")
+
+# Yield tables of parameters.py
+yieldTables = ["pf", "sfp"]
+
+defaultLibrary = "default"
+
+def compileData(filename=dataFile, xls=None, source=None):
+    """
+    Return a dictionary of the arrays of the isotope data and yield
+    tables of parameters.py, or of the file 'source' laid out like it,
+    and of the yield table of the Excel workbook 'xls' if given, and
+    write them to 'filename' unless it is None. The archive is written
+    to a temporary file that then replaces 'filename', so that another
+    process never reads it half written. The optional variable
+    'version' of the source is stored as the library version.
+    """
+
+    import numpy as np
+
+    if source is None:
+        import parameters
+        namespace = vars(parameters)
+    else:
+        namespace = {}
+        exec(compile(open(source).read(), source, "exec"), namespace)
+
+    arrays = {"version": np.array(dataVersion),
+              "libraryVersion": np.array(str(namespace.get("version", "")),
+                                         dtype="U")}
+    if "data" in namespace:
+        data = namespace["data"]
+        names = sorted(data)
+        arrays["dataNames"] = np.array(names, dtype="U")
+        arrays["data"] = np.array([data[name] for name in names], dtype=float)
+    tables = dict((name, namespace[name]) for name in yieldTables
+                  if name in namespace)
+    if xls is not None:
+        tables["xls"] = readWorkbook(xls)
+    for name, table in tables.items():
+        arrays[name + "Parents"] = np.array(table[0][1:], dtype="U")
+        arrays[name + "Daughters"] = np.array([row[0] for row in table[1:]],
+                                              dtype="U")
+        arrays[name + "Fractions"] = np.array([row[1:] for row in table[1:]],
+                                              dtype=float)
+
+    if filename is not None:
+        fd, temporary = tempfile.mkstemp(
+            ".npz", ".tmp", os.path.dirname(os.path.abspath(filename)))
+        try:
+            fh = os.fdopen(fd, "wb")
+            try:
+                np.savez(fh, **arrays)
+            finally:
+                fh.close()
+            replaceFile(temporary, filename)
+        except:
+            os.remove(temporary)
+            raise
+    return arrays
+
+def replaceFile(source, destination):
+    """Rename the file 'source' to 'destination', replacing it"""
+
+    if hasattr(os, "replace"):
+        os.replace(source, destination)
+        return
+    if sys.platform.startswith("win") and os.path.exists(destination):
+        os.remove(destination)
+    os.rename(source, destination)
+
+def readWorkbook(filename, sheet=0):
+    """
+    Return the yield table in the first sheet of the Excel workbook
+    'filename' as a list of rows like parameters.pf: a header row of
+    parent names after one label cell, then one row per daughter with
+    its name and yields. Requires the xlrd package.
+    """
+
+    if xlrd is None:
+        raise ImportError("xlrd is needed to read {0}".format(filename))
+    sheet = xlrd.open_workbook(filename).sheet_by_index(sheet)
+    table = [[str(value).strip() for value in sheet.row_values(0)]]
+    for n in range(1, sheet.nrows):
+        row = sheet.row_values(n)
+        if not str(row[0]).strip():
+            continue
+        table.append([str(row[0]).strip()] + [float(value or 0.0)
+                                              for value in row[1:]])
+    return table
+
+def isCurrent(filename=dataFile, source=sourceFile):
+    """
+    Determine whether the compiled data 'filename' exists, can be
+    read, has the current layout and is newer than its source
+    """
+
+    import numpy as np
+
+    if not os.path.exists(filename):
+        return False
+    if os.path.exists(source) and \
+            os.path.getmtime(filename) < os.path.getmtime(source):
+        return False
+    if not zipfile.is_zipfile(filename):
+        return False
+    try:
+        arrays = np.load(filename)
+        try:
+            return int(arrays["version"]) == dataVersion
+        finally:
+            arrays.close()
+    except (IOError, OSError, ValueError, KeyError, zipfile.BadZipfile):
+        # A corrupt archive is compiled again
+        return False
+
+def loadArrays(filename, source):
+    """
+    Return the arrays compiled from 'source' into 'filename', compiling
+    them first if needed. If 'filename' cannot be written, the arrays
+    are compiled in memory.
+    """
+
+    import numpy as np
+
+    if not isCurrent(filename, source):
+        try:
+            compileData(filename, source=source)
+        except (IOError, OSError):
+            return compileData(None, source=source)
+    return np.load(filename)
+
+
+class NuclearData(object):
+    """
+    Library of nuclear data from a compiled archive or a dictionary of
+    arrays from compileData, each read when first used. Arrays missing
+    from the library are taken from the library 'fallback'.
+
+    Attributes:
+      name = name of the library
+      version = version of the library given by its source
+      names = names of the isotopes with data, upper case
+      index = dictionary of the form {name: row of data}
+      data = array with the heat rate (W/kg), photon heat (W/kg),
+             neutron production (N/s-kg), external dose (Sv/hr-kg at
+             1 m) and ingestion and inhalation radiotoxicity of each
+             isotope
+
+    Methods:
+      row(name) = list of the data of an isotope, or None
+      table(yields) = parents, daughters and yields of a yield table
+      tables() = names of the yield tables available
+      cached(key, build) = object compiled once from the library
+    """
+
+    def __init__(self, arrays, name=defaultLibrary, fallback=None):
+        self.name = name
+        self.fallback = fallback
+        self._arrays = arrays
+        self._loaded = {}
+        self._index = None
+        self._rows = None
+        self._cache = {}
+
+    def _array(self, name):
+        if name not in self._loaded:
+            if name in self._files():
+                self._loaded[name] = self._arrays[name]
+            elif self.fallback is not None:
+                self._loaded[name] = self.fallback._array(name)
+            else:
+                raise KeyError("no {0} in nuclear data {1}".format(
+                        name, self.name))
+        return self._loaded[name]
+
+    def _files(self):
+        return getattr(self._arrays, "files", self._arrays.keys())
+
+    @property
+    def version(self):
+        if "libraryVersion" not in self._files():
+            return ""
+        return str(self._array("libraryVersion"))
+
+    @property
+    def names(self):
+        return [str(name) for name in self._array("dataNames")]
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = dict((name, i) for i, name in enumerate(self.names))
+        return self._index
+
+    @property
+    def data(self):
+        return self._array("data")
+
+    def row(self, name):
+        """Return the list of data of the isotope 'name', or None"""
+
+        if self._rows is None:
+            self._rows = dict(zip(self.names, self.data.tolist()))
+        return self._rows.get(name.upper())
+
+    def table(self, yields="pf"):
+        """
+        Return the names of the parents, the names of the daughters and
+        the array of yields (daughters x parents) of the yield table
+        'yields'
+        """
+
+        return ([str(name) for name in self._array(yields + "Parents")],
+                [str(name) for name in self._array(yields + "Daughters")],
+                self._array(yields + "Fractions"))
+
+    def tables(self):
+        """Return the names of the yield tables available"""
+
+        names = set(name[:-len("Parents")] for name in self._files()
+                    if name.endswith("Parents"))
+        if self.fallback is not None:
+            names.update(self.fallback.tables())
+        return sorted(names)
+
+    def cached(self, key, build):
+        """
+        Return the object stored under 'key', calling build() to create
+        it the first time
+        """
+
+        if key not in self._cache:
+            self._cache[key] = build()
+        return self._cache[key]
+
+# Registry of the form {name: <NuclearData instance>}
+libraries = OrderedDict()
+
+def nuclearData(library=None):
+    """
+    Return the NuclearData of the library named 'library', by default
+    the one compiled from parameters.py. The default library is
+    compiled first if its archive is missing or out of date.
+    """
+
+    if library is None:
+        library = defaultLibrary
+    if library not in libraries:
+        if library != defaultLibrary:
+            raise ValueError("unknown nuclear data library " + library)
+        libraries[library] = NuclearData(loadArrays(dataFile, sourceFile))
+    return libraries[library]
+
+def registerLibrary(name, filename):
+    """
+    Add the nuclear data library 'name' from 'filename', either a file
+    laid out like parameters.py, which is compiled to an archive next to
+    it, or a compiled archive. Returns the NuclearData.
+    """
+
+    import numpy as np
+
+    if name == defaultLibrary:
+        raise ValueError("cannot replace the default nuclear data library")
+    if filename.endswith(".py"):
+        arrays = loadArrays(os.path.splitext(filename)[0] + ".npz", filename)
+    else:
+        arrays = np.load(filename)
+    libraries[name] = NuclearData(arrays, name, nuclearData())
+    return libraries[name]
+
+
+if __name__ == "__main__":
+    compileData(xls=sys.argv[1] if len(sys.argv) > 1 else None)
+    print("Wrote {0}".format(dataFile))
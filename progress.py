@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+"""
+Progress reporting for long-running operations such as loading an
+ERANOS output. An operation calls start() with a label and the number
+of steps, then update() with the number of steps done, and stops if
+update() returns False.
+"""
+
+from __future__ import division, print_function
+import sys
+
+class NullProgress(object):
+    """
+    Progress reporter that does nothing, for batch use.
+
+    Methods:
+      start(label, maximum) = begin an operation with maximum steps
+      update(value) = report steps done; returns False to cancel
+      finish() = end the operation
+    """
+
+    def start(self, label, maximum):
+        pass
+
+    def update(self, value):
+        return True
+
+    def finish(self):
+        pass
+
+
+class ConsoleProgress(NullProgress):
+    """
+    Progress reporter that writes the percentage done to a stream,
+    sys.stderr by default.
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream
+        self.label = ""
+        self.maximum = 0
+        self._percent = None
+
+    def start(self, label, maximum):
+        self.label = label
+        self.maximum = maximum
+        self._percent = None
+        self.update(0)
+
+    def update(self, value):
+        percent = 100*value//self.maximum if self.maximum else 100
+        if percent != self._percent:
+            self._percent = percent
+            stream = self.stream or sys.stderr
+            stream.write("\r{0} {1:3d}%".format(self.label, percent))
+            stream.flush()
+        return True
+
+    def finish(self):
+        if self._percent is not None:
+            (self.stream or sys.stderr).write("\n")
+            self._percent = None
+
+
+class QtProgress(NullProgress):
+    """
+    Progress reporter showing a modal QProgressDialog with a Cancel
+    button. PyQt4 is only imported once progress is reported, by start()
+    and update().
+    """
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.dialog = None
+
+    def start(self, label, maximum):
+        from PyQt4.QtCore import Qt
+        from PyQt4.QtGui import QProgressDialog
+
+        self.dialog = QProgressDialog(label, "Cancel", 0, maximum,
+                                      self.parent)
+        self.dialog.setWindowModality(Qt.WindowModal)
+        self.dialog.setWindowTitle("Loading...")
+        self.dialog.setMinimumDuration(0)
+        self.dialog.setValue(0)
+
+    def update(self, value):
+        from PyQt4.QtCore import QCoreApplication
+
+        QCoreApplication.processEvents()
+        if self.dialog.wasCanceled():
+            return False
+        self.dialog.setValue(value)
+        return True
+
+    def finish(self):
+        if self.dialog is not None:
+            self.dialog.reset()
+            self.dialog = None
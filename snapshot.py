@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+
+"""
+Binary snapshot of the data loaded from an ERANOS output, stored as a
+numpy .npz archive so that processed results can be exchanged and
+reopened without the original output.
+
+The composition of every material is one row of a matrix over all the
+nuclides in the snapshot. Materials of the charge and discharge streams
+are stored as rows belonging to no cycle. The arrays are stored
+uncompressed, so that a snapshot is opened by memory-mapping them.
+"""
+
+from __future__ import division, print_function
+import os
+import struct
+import zipfile
+from collections import OrderedDict
+
+import numpy as np
+
+from isotope import Isotope, FissionProduct
+from material import Material
+from cycle import Cycle, LazyMaterials
+from eranos import streamNames
+
+# Increment whenever the layout of the snapshot changes
+snapshotVersion = 1
+
+materialAttributes = ["volume", "nuFissionRate", "absorptionRate",
+                      "diffRate", "flux", "power", "dpa"]
+cycleFeeds = ["uraniumAdded", "additionalFeed", "dpa", "power"]
+
+def saveSnapshot(filename, data):
+    """
+    Write the data returned by eranos.loadData to the snapshot
+    'filename'. Materials of lazily loaded cycles are read from the
+    ERANOS output as they are written.
+    """
+
+    cycles, streams = data[0], data[1:]
+
+    # List materials as (cycle index, node, name, Material)
+    rows = []
+    for i, cycle in enumerate(cycles):
+        for key in sorted(cycle.materials):
+            rows.append((i, key[0], key[1], cycle.materials[key]))
+    for name, material in zip(streamNames, streams):
+        rows.append((-1, 0, name, material))
+
+    # Collect nuclides and material names over all materials
+    nuclides = {}
+    for row in rows:
+        for name, iso in row[3].isotopes.items():
+            nuclides[name] = isinstance(iso, FissionProduct)
+    nuclideNames = sorted(nuclides)
+    column = dict((name, j) for j, name in enumerate(nuclideNames))
+    materialNames = sorted(set(row[2] for row in rows))
+    nameIndex = dict((name, j) for j, name in enumerate(materialNames))
+
+    mass = np.zeros((len(rows), len(nuclideNames)))
+    present = np.zeros((len(rows), len(nuclideNames)), dtype=bool)
+    arrays = dict((name, np.empty(len(rows))) for name in materialAttributes)
+    for i, (n, node, name, material) in enumerate(rows):
+        for isoName, iso in material.isotopes.items():
+            mass[i, column[isoName]] = iso.mass
+            present[i, column[isoName]] = True
+        for attribute in materialAttributes:
+            value = getattr(material, attribute)
+            arrays[attribute][i] = np.nan if value is None else value
+
+    arrays.update(
+        version=np.array(snapshotVersion),
+        nuclides=np.array(nuclideNames, dtype="U"),
+        fissionProduct=np.array([nuclides[name] for name in nuclideNames],
+                                dtype=bool),
+        materialNames=np.array(materialNames, dtype="U"),
+        materialCycle=np.array([row[0] for row in rows], dtype=np.int32),
+        materialNode=np.array([row[1] for row in rows], dtype=np.int32),
+        materialName=np.array([nameIndex[row[2]] for row in rows],
+                              dtype=np.int32),
+        mass=mass,
+        present=present,
+        cycleN=np.array([c.n for c in cycles], dtype=np.int32),
+        cycleTimestep=np.array([c.timestep for c in cycles],
+                               dtype=np.int32),
+        cycleIterations=np.array([c.iterations for c in cycles],
+                                 dtype=np.int32),
+        cycleCooling=np.array([np.nan if c.cooling_time is None
+                               else c.cooling_time for c in cycles]),
+        cycleRequiredFeed=np.array([c.requiredFeed for c in cycles],
+                                   dtype=float),
+        cycleExtraMass=np.array([getattr(c, "extraMass", -1)
+                                 for c in cycles], dtype=np.int8))
+
+    # Dictionaries of each cycle as (cycle index, key, value) triplets
+    for attribute in cycleFeeds:
+        items = [(i, key, value) for i, cycle in enumerate(cycles)
+                 for key, value in sorted(getattr(cycle, attribute).items())]
+        arrays[attribute + "Cycle"] = np.array([item[0] for item in items],
+                                               dtype=np.int32)
+        arrays[attribute + "Key"] = np.array([item[1] for item in items],
+                                             dtype="U")
+        arrays[attribute + "Value"] = np.array([item[2] for item in items],
+                                               dtype=float)
+
+    fh = open(filename, "wb")
+    try:
+        np.savez(fh, **arrays)
+    finally:
+        fh.close()
+
+def loadSnapshot(filename):
+    """
+    Return the data stored in the snapshot 'filename' in the form
+    returned by eranos.loadData. The arrays of the snapshot are
+    memory-mapped, and the materials of each cycle are only built from
+    their rows when first used.
+    """
+
+    source = SnapshotSource(filename)
+    arrays = source.arrays
+    if int(arrays["version"]) != snapshotVersion:
+        raise ValueError("{0} is not a version {1} snapshot".format(
+                filename, snapshotVersion))
+
+    cycles = []
+    for i in range(len(arrays["cycleN"])):
+        cooling = float(arrays["cycleCooling"][i])
+        cycle = Cycle(int(arrays["cycleN"][i]),
+                      int(arrays["cycleTimestep"][i]),
+                      int(arrays["cycleIterations"][i]),
+                      None if np.isnan(cooling) else cooling)
+        cycle.requiredFeed = float(arrays["cycleRequiredFeed"][i])
+        if arrays["cycleExtraMass"][i] >= 0:
+            cycle.extraMass = bool(arrays["cycleExtraMass"][i])
+        cycle.materials = LazyMaterials(source)
+        cycles.append(cycle)
+    for attribute in cycleFeeds:
+        for i, key, value in zip(arrays[attribute + "Cycle"],
+                                 arrays[attribute + "Key"],
+                                 arrays[attribute + "Value"]):
+            getattr(cycles[i], attribute)[str(key)] = float(value)
+
+    streams = dict()
+    names = [str(name) for name in arrays["materialNames"]]
+    for row, (i, node, name) in enumerate(zip(arrays["materialCycle"],
+                                              arrays["materialNode"],
+                                              arrays["materialName"])):
+        if i < 0:
+            streams[names[name]] = source.material(row)
+        else:
+            cycles[i].materials.addStub((int(node), names[name]), row)
+    return tuple([cycles] + [streams.get(name, Material())
+                             for name in streamNames])
+
+
+class SnapshotSource(object):
+    """
+    Builds materials on demand from the arrays of a snapshot for
+    LazyMaterials, keeping the most recently used ones in memory.
+
+    Attributes:
+      filename = path of the snapshot
+      arrays = dictionary of the arrays in the snapshot, memory-mapped
+      size = maximum number of materials kept in memory
+    """
+
+    def __init__(self, filename, size=100):
+        self.filename = os.path.abspath(filename)
+        self.size = size
+        self.arrays = mapArchive(filename)
+        self._nuclides = [str(name) for name in self.arrays["nuclides"]]
+        self._cache = OrderedDict()
+
+    def material(self, stub):
+        """
+        Return the Material for a MaterialStub, or for a row of the
+        snapshot.
+        """
+
+        row = getattr(stub, "offset", stub)
+        material = self._cache.pop(row, None)
+        if material is None:
+            # Only the entries of the row's nuclides are read from the
+            # mapped arrays
+            columns = np.flatnonzero(self.arrays["present"][row])
+            masses = self.arrays["mass"][row, columns].tolist()
+            fissionProduct = self.arrays["fissionProduct"][columns].tolist()
+            isotopes = {}
+            order = []
+            for j, mass, fp in zip(columns.tolist(), masses, fissionProduct):
+                name = self._nuclides[j]
+                cls = FissionProduct if fp else Isotope
+                isotopes[name] = cls(name, mass)
+                order.append(name)
+            material = Material()
+            material._setIsotopes(isotopes, any(fissionProduct), order)
+            for attribute in materialAttributes:
+                value = float(self.arrays[attribute][row])
+                setattr(material, attribute,
+                        None if np.isnan(value) else value)
+        self._cache[row] = material
+        while len(self._cache) > self.size:
+            self._cache.popitem(last=False)
+        return material
+
+    def __reduce__(self):
+        return (SnapshotSource, (self.filename, self.size))
+
+
+def mapArchive(filename):
+    """
+    Return a dictionary of the arrays of the .npz archive 'filename'.
+    Arrays stored uncompressed, as np.savez writes them, are
+    memory-mapped from the archive instead of read into memory.
+    """
+
+    arrays = {}
+    archive = zipfile.ZipFile(filename)
+    fh = open(filename, "rb")
+    try:
+        for info in archive.infolist():
+            name = info.filename
+            if name.endswith(".npy"):
+                name = name[:-4]
+            if info.compress_type != zipfile.ZIP_STORED:
+                arrays[name] = np.lib.format.read_array(archive.open(info))
+                continue
+
+            # The data of a member follows its local header
+            fh.seek(info.header_offset)
+            header = fh.read(30)
+            nameLength, extraLength = struct.unpack("<HH", header[26:30])
+            start = info.header_offset + 30 + nameLength + extraLength
+            fh.seek(start)
+            version = np.lib.format.read_magic(fh)
+            if version == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(fh)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(fh)
+            if dtype.hasobject or not shape or 0 in shape:
+                fh.seek(start)
+                arrays[name] = np.lib.format.read_array(fh)
+            else:
+                arrays[name] = np.memmap(filename, dtype, "r", fh.tell(),
+                                         shape, "F" if fortran else "C")
+    finally:
+        fh.close()
+        archive.close()
+    return arrays
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+"""
+Tests of the cache of loaded ERANOS outputs of cache.py. Run with:
+
+    python -m unittest test_cache
+"""
+
+from __future__ import division, print_function
+import os
+import shutil
+import tempfile
+import unittest
+
+import cache
+from test_eranos import loadData, smallOutput
+
+
+class CacheTest(unittest.TestCase):
+    """A cached load gives the materials of the original load"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.environ = os.environ.get("XDG_CACHE_HOME")
+        os.environ["XDG_CACHE_HOME"] = os.path.join(self.directory, "cache")
+        self.filename = os.path.join(self.directory, "small.data.1")
+        shutil.copy(smallOutput, self.filename)
+
+    def tearDown(self):
+        if self.environ is None:
+            del os.environ["XDG_CACHE_HOME"]
+        else:
+            os.environ["XDG_CACHE_HOME"] = self.environ
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        data = loadData(self.filename)
+        path = cache.saveCache(self.filename, data)
+        self.assertEqual(path, self.filename + cache.cacheSuffix)
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ["cache", "small.data.1", "small.data.1.eptcache"])
+
+        cached = cache.loadCache(self.filename)
+        self.assertEqual(len(cached[0]), len(data[0]))
+        for cycle, original in zip(cached[0], data[0]):
+            self.assertEqual(cycle.n, original.n)
+            self.assertEqual(cycle.materials.keys(),
+                             original.materials.keys())
+            for key, material in original.materials.items():
+                self.assertEqual(cycle.materials[key].volume,
+                                 material.volume)
+
+    def test_cached_materials_as_dict(self):
+        data = loadData(self.filename)
+        cache.saveCache(self.filename, data)
+        materials = data[0][0].materials
+
+        def cached():
+            return cache.loadCache(self.filename)[0][0].materials
+
+        self.assertEqual(sorted(dict(cached())), sorted(materials))
+        update = {}
+        update.update(cached())
+        self.assertEqual(sorted(update), sorted(materials))
+        self.assertEqual(len(cached().values()), len(materials))
+        key = next(iter(materials))
+        remaining = cached()
+        self.assertEqual(remaining.pop(key).volume, materials[key].volume)
+        self.assertEqual(len(remaining), len(materials) - 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+
+"""
+Tests of the ERANOS output parser of eranos.py against a small output
+in testdata. The expected values in testdata/small.json were produced
+by the loader that preceded the single-pass parser. Run with:
+
+    python -m unittest test_eranos
+"""
+
+from __future__ import division, print_function
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from StringIO import StringIO
+
+import eranos
+
+testData = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "testdata")
+smallOutput = os.path.join(testData, "small.data.1")
+
+
+def quiet(function, *args, **kwargs):
+    """Call function without printing its progress messages"""
+
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        sys.stdout = stdout
+
+
+def loadData(filename, **kwargs):
+    """Call eranos.loadData without the progress messages"""
+
+    return quiet(eranos.loadData, filename, gui=False, **kwargs)
+
+
+class ExpectedData(object):
+    """Assertions on the data loaded from the output in testdata"""
+
+    @classmethod
+    def setUpClass(cls):
+        with open(os.path.join(testData, "small.json")) as f:
+            cls.expected = json.load(f)
+
+    def assertMaterial(self, material, expected):
+        isotopes = material.isotopes
+        self.assertEqual(len(isotopes), expected["count"])
+        self.assertAlmostEqual(sum(iso.mass for iso in isotopes.values()),
+                               expected["total"], places=9)
+        for name, mass in expected["masses"].items():
+            self.assertEqual(isotopes[name].mass, mass)
+
+    def assertCycles(self, cycles):
+        expected = self.expected["cycles"]
+        self.assertEqual(len(cycles), len(expected))
+        for cycle, value in zip(cycles, expected):
+            for attribute in ["n", "timestep", "iterations", "cooling_time",
+                              "requiredFeed", "uraniumAdded",
+                              "additionalFeed", "extraMass"]:
+                self.assertEqual(getattr(cycle, attribute, None),
+                                 value[attribute])
+            self.assertEqual(sorted(cycle.materials.keys()),
+                             [(m["node"], m["name"])
+                              for m in value["materials"]])
+            for m in value["materials"]:
+                material = cycle.materials[(m["node"], m["name"])]
+                for attribute in ["volume", "nuFissionRate",
+                                  "absorptionRate", "diffRate", "flux",
+                                  "power", "dpa"]:
+                    self.assertEqual(getattr(material, attribute),
+                                     m[attribute])
+                self.assertMaterial(material, m)
+
+    def assertStreams(self, streams):
+        self.assertEqual(len(streams), len(self.expected["streams"]))
+        for material, expected in zip(streams, self.expected["streams"]):
+            self.assertMaterial(material, expected)
+
+
+class ParserTest(ExpectedData, unittest.TestCase):
+    """loadData gives the cycles, materials and streams expected"""
+
+    def test_load(self):
+        data = loadData(smallOutput)
+        self.assertCycles(data[0])
+        self.assertStreams(data[1:])
+
+    def test_lazy_load(self):
+        data = loadData(smallOutput, lazy=True)
+        self.assertCycles(data[0])
+        self.assertStreams(data[1:])
+
+    def test_parallel_load(self):
+        data = loadData(smallOutput, workers=2)
+        self.assertCycles(data[0])
+        self.assertStreams(data[1:])
+
+        # The pooled result is the serial one
+        serial = loadData(smallOutput)[0]
+        for cycle, expected in zip(data[0], serial):
+            self.assertEqual(cycle.materials.keys(),
+                             expected.materials.keys())
+            for key, material in expected.materials.items():
+                self.assertEqual(
+                    [(name, iso.mass) for name, iso
+                     in cycle.materials[key].isotopes.items()],
+                    [(name, iso.mass) for name, iso
+                     in material.isotopes.items()])
+
+
+class TruncatedOutputTest(unittest.TestCase):
+    """A MATERIAL block cut off at the end of the output is left out"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "small.data.1")
+        with open(smallOutput, "rb") as f:
+            data = f.read()
+        # End the output in the middle of the final BLANK block
+        end = data.rindex(b"MATERIAL BLANK")
+        self.offset = data.rindex(b"\n", 0, end) + 1
+        with open(self.filename, "wb") as f:
+            f.write(data[:end + 300])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_lazy_load(self):
+        cycles = loadData(self.filename, lazy=True)[0]
+        final = cycles[-1].materials
+        self.assertFalse((0,"BLANK") in final)
+        self.assertEqual(sorted(final), [(0,"FUEL{0}".format(i))
+                                         for i in range(1, 10)])
+        self.assertEqual(len(final[(0,"FUEL9")].isotopes), 184)
+
+    def test_load(self):
+        final = loadData(self.filename)[0][-1].materials
+        self.assertEqual(len(final), 9)
+        self.assertFalse((0,"BLANK") in final)
+
+    def test_read_material_at(self):
+        fh = open(self.filename, "rb")
+        try:
+            self.assertRaises(ValueError, eranos.readMaterialAt, fh,
+                              self.offset)
+        finally:
+            fh.close()
+
+
+class FollowerTest(ExpectedData, unittest.TestCase):
+    """EranosFollower reads an output as it is written"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "small.data.1")
+        with open(smallOutput, "rb") as f:
+            self.data = f.read()
+        # The first cycle is complete once the second one starts
+        self.split = self.data.index(b" ->CYCLE 2")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, data, mode="wb"):
+        with open(self.filename, mode) as f:
+            f.write(data)
+
+    def poll(self, follower):
+        return quiet(follower.poll)
+
+    def follow(self, lazy):
+        self.write(self.data[:self.split])
+        follower = eranos.EranosFollower(self.filename, lazy)
+        cycles = self.poll(follower)
+        self.assertEqual([cycle.n for cycle in cycles], [1])
+        self.assertFalse(follower.reset)
+        self.assertFalse(follower.finished)
+
+        # Append the rest in two parts, the first ending mid-line
+        middle = self.data.index(b"MATERIAL BLANK", self.split) + 5
+        self.write(self.data[self.split:middle], "ab")
+        self.assertEqual(self.poll(follower), [])
+        self.write(self.data[middle:], "ab")
+        cycles = self.poll(follower)
+        self.assertEqual([cycle.n for cycle in cycles], [2])
+        self.assertTrue(follower.finished)
+        self.assertEqual(self.poll(follower), [])
+        self.assertEqual(follower.appended, 0)
+
+        # A truncated file is read again from the start
+        self.write(self.data[:self.split])
+        cycles = self.poll(follower)
+        self.assertTrue(follower.reset)
+        self.assertEqual([cycle.n for cycle in cycles], [1])
+        self.assertEqual([cycle.n for cycle in follower.cycles], [1])
+        self.assertFalse(follower.finished)
+
+        self.write(self.data[self.split:], "ab")
+        self.poll(follower)
+        self.assertFalse(follower.reset)
+        data = quiet(follower.finish)
+        self.assertCycles(data[0])
+        self.assertStreams(data[1:])
+
+    def test_follow(self):
+        self.follow(lazy=False)
+
+    def test_follow_lazy(self):
+        self.follow(lazy=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
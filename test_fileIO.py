@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+
+"""
+Tests of the reading of compressed files with fileIO.CompressedFile.
+The xz and zstd tests are skipped when the lzma module or the
+zstandard package is missing. Run with:
+
+    python -m unittest test_fileIO
+"""
+
+from __future__ import division, print_function
+import gzip
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import fileIO
+from fileIO import CompressedFile, openFile
+
+
+def sampleLines(count=4000, seed=3):
+    """Return a list of text lines of varying length"""
+
+    r = random.Random(seed)
+    words = [b"MATERIAL", b"FUEL3", b"1.0000E+00", b"->CHARGE", b"Pu239"]
+    return [b" ".join(r.choice(words) for i in range(r.randint(0, 12)))
+            + b"\n" for n in range(count)]
+
+
+class CompressedFileTest(unittest.TestCase):
+    """Reads and seeks give the bytes of the uncompressed file"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.lines = sampleLines()
+        self.data = b"".join(self.lines)
+        self.offsets = [0]
+        for line in self.lines:
+            self.offsets.append(self.offsets[-1] + len(line))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def writeGzip(self, name, members=1):
+        size = len(self.data) // members + 1
+        with open(self.path(name), "wb") as f:
+            for start in range(0, len(self.data), size):
+                member = gzip.GzipFile(fileobj=f, mode="wb")
+                member.write(self.data[start:start + size])
+                member.close()
+        return self.path(name)
+
+    def open(self, filename, format):
+        fh = CompressedFile(filename, format)
+        # Small blocks and checkpoints, so that seeks cross many of them
+        fh.blockSize = 512
+        fh.checkpointInterval = 4096
+        return fh
+
+    def assertReads(self, fh):
+        # Sequential lines and offsets
+        for offset, line in zip(self.offsets, self.lines):
+            self.assertEqual(fh.tell(), offset)
+            self.assertEqual(fh.readline(), line)
+        self.assertEqual(fh.readline(), b"")
+
+        # Seeks backward and forward to the start of lines
+        r = random.Random(5)
+        for n in range(200):
+            i = r.randrange(len(self.lines))
+            fh.seek(self.offsets[i])
+            self.assertEqual(fh.readline(), self.lines[i])
+            self.assertEqual(fh.tell(), self.offsets[i + 1])
+
+        # Seeks to any byte, relative seeks and reads
+        for n in range(100):
+            offset = r.randrange(len(self.data))
+            fh.seek(offset)
+            self.assertEqual(fh.read(100), self.data[offset:offset + 100])
+            fh.seek(-50, 1)
+            self.assertEqual(fh.read(10), self.data[offset + 50:offset + 60])
+        fh.seek(-10, 2)
+        self.assertEqual(fh.read(), self.data[-10:])
+        fh.seek(0)
+        self.assertEqual(b"".join(fh), self.data)
+
+    def test_gzip(self):
+        filename = self.writeGzip("out.gz")
+        self.assertEqual(fileIO.compressionFormat(filename), "gzip")
+        self.assertTrue(fileIO.seekable(filename))
+        with self.open(filename, "gzip") as fh:
+            self.assertReads(fh)
+            self.assertTrue(len(fh._checkpoints) > 10)
+
+    def test_gzip_members(self):
+        filename = self.writeGzip("out.gz", members=7)
+        with self.open(filename, "gzip") as fh:
+            self.assertReads(fh)
+        with openFile(filename) as fh:
+            self.assertEqual(fh.read(), self.data)
+
+    @unittest.skipIf(fileIO.lzma is None, "lzma is not installed")
+    def test_xz(self):
+        filename = self.path("out.xz")
+        with open(filename, "wb") as f:
+            # Two streams
+            half = len(self.data) // 2
+            f.write(fileIO.lzma.compress(self.data[:half]))
+            f.write(fileIO.lzma.compress(self.data[half:]))
+        self.assertEqual(fileIO.compressionFormat(filename), "xz")
+        self.assertFalse(fileIO.seekable(filename))
+        with self.open(filename, "xz") as fh:
+            self.assertReads(fh)
+
+    @unittest.skipIf(fileIO.zstandard is None, "zstandard is not installed")
+    def test_zstd(self):
+        filename = self.path("out.zst")
+        with open(filename, "wb") as f:
+            f.write(fileIO.zstandard.ZstdCompressor().compress(self.data))
+        self.assertEqual(fileIO.compressionFormat(filename), "zstd")
+        self.assertFalse(fileIO.seekable(filename))
+        with self.open(filename, "zstd") as fh:
+            self.assertReads(fh)
+
+    def test_uncompressed(self):
+        filename = self.path("out")
+        with open(filename, "wb") as f:
+            f.write(self.data)
+        self.assertEqual(fileIO.compressionFormat(filename), None)
+        with openFile(filename) as fh:
+            self.assertFalse(isinstance(fh, CompressedFile))
+            self.assertEqual(fh.read(), self.data)
+
+
+if __name__ == "__main__":
+    unittest.main()
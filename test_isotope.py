@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+"""
+Tests of the isotopes of isotope.py and of their storage in materials.
+Run with:
+
+    python -m unittest test_isotope
+"""
+
+from __future__ import division, print_function
+import sys
+import unittest
+
+from isotope import Isotope, FissionProduct
+from material import Material, IsotopeArray
+
+
+def expandedMaterial():
+    """Return a Material with the daughters of two fission products"""
+
+    material = Material()
+    for name in ["U235", "Pu239", "Am241", "Fe56"]:
+        material.addMass(name, 1.0)
+    material.addMass("sfpU235", 2.0, True)
+    material.addMass("sfpPu239", 2.0, True)
+    material.expandFPs()
+    return material
+
+
+class SizeTest(unittest.TestCase):
+    """Isotopes are stored without a dictionary per isotope"""
+
+    def test_slots(self):
+        material = expandedMaterial()
+        material.compact()
+        for iso in [Isotope("U235", 1.0), FissionProduct("sfpU235", 1.0)]:
+            self.assertFalse(hasattr(iso, "__dict__"))
+            self.assertTrue(sys.getsizeof(iso) <= 64)
+        # Views are only created when an isotope is accessed
+        self.assertFalse(hasattr(material.isotopes["U235"], "__dict__"))
+
+    def test_isotope_size(self):
+        # An isotope with the attributes Isotope set before it used
+        # __slots__
+        class DictIsotope(object):
+            pass
+        old = DictIsotope()
+        old.element, old.Z, old.A, old.meta, old.mass = "U", 92, 235, False, 1.0
+        oldSize = sys.getsizeof(old) + sys.getsizeof(old.__dict__)
+        self.assertTrue(2*sys.getsizeof(Isotope("U235", 1.0)) <= oldSize)
+
+    def test_compact_storage(self):
+        material = expandedMaterial()
+        isotopes = material.isotopes
+        self.assertTrue(isinstance(isotopes, dict))
+        size = sys.getsizeof(isotopes) + sum(sys.getsizeof(iso) for iso
+                                             in isotopes.values())
+        masses = dict((name, iso.mass) for name, iso in isotopes.items())
+
+        material.compact()
+        isotopes = material.isotopes
+        self.assertTrue(isinstance(isotopes, IsotopeArray))
+        compactSize = (isotopes.masses.nbytes + isotopes.present.nbytes +
+                       sys.getsizeof(isotopes.fissionProducts))
+        self.assertEqual(dict((name, iso.mass) for name, iso
+                              in isotopes.items()), masses)
+        # Bytes per isotope
+        self.assertTrue(compactSize/len(masses) <= 16)
+        self.assertTrue(4*compactSize <= size)
+
+
+class IsotopeViewTest(unittest.TestCase):
+    """Changing masses through an IsotopeArray updates the material"""
+
+    def test_set_mass(self):
+        material = expandedMaterial()
+        material.compact()
+        total = material.mass()
+        material.isotopes["U235"].mass += 3.0
+        self.assertAlmostEqual(material.mass(), total + 3.0)
+        material.find("u235").mass = 0.0
+        self.assertAlmostEqual(material.mass(), total - 1.0)
+
+    def test_set_item(self):
+        material = expandedMaterial()
+        material.compact()
+        total = material.mass(Actinide=True)
+        material.isotopes["Am241"] = Isotope("Am241", 5.0)
+        self.assertAlmostEqual(material.mass(Actinide=True), total + 4.0)
+        del material.isotopes["Am241"]
+        self.assertAlmostEqual(material.mass(Actinide=True), total - 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
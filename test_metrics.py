@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+"""
+Tests of the metric kernels of metrics.py where the Material method of
+the same name cannot be evaluated. Run with:
+
+    python -m unittest test_metrics
+"""
+
+from __future__ import division, print_function
+import unittest
+
+import numpy as np
+
+import metrics
+from material import Material
+
+
+class MaskedKernelTest(unittest.TestCase):
+    """The kernels give NaN where the Material method divides by zero"""
+
+    def assertNaN(self, values, expected):
+        self.assertEqual(np.isnan(values).tolist(), expected)
+
+    def test_charlton5_without_significant_quantity(self):
+        material = Material()
+        material.addMass("Am241", 1.0)
+        self.assertEqual(material.SQ(), 0.0)
+        self.assertRaises(ZeroDivisionError, material.charlton5)
+
+        u = metrics.charlton5(np.array([1.0, 1.0, 0.0]),
+                              np.array([0.0, 2.0, 0.0]))
+        self.assertNaN(u, [True, False, True])
+        self.assertAlmostEqual(u[1], 0.0035714*50 + 0.232143)
+
+    def test_mohit12_without_mass(self):
+        material = Material()
+        self.assertRaises(ZeroDivisionError, material.mohit12)
+
+        u = metrics.mohit12(np.array([1.0, 1.0, 0.0]),
+                            np.array([0.0, 1.0, 0.0]))
+        self.assertNaN(u, [True, False, True])
+        self.assertEqual(u[1], 1.0)
+
+    def test_charlton2_without_plutonium(self):
+        material = Material()
+        material.addMass("U235", 1.0)
+        self.assertRaises(ZeroDivisionError, material.charlton2)
+
+        self.assertNaN(metrics.charlton2(np.array([1.0, 1.0]),
+                                         np.array([0.0, 1.0])),
+                       [True, False])
+
+    def test_charlton4_without_mass(self):
+        material = Material()
+        self.assertRaises(ZeroDivisionError, material.charlton4)
+
+        self.assertNaN(metrics.charlton4(np.array([0.0, 1.0]),
+                                         np.array([0.0, 1.0])),
+                       [True, False])
+
+    def test_bathke_without_mass(self):
+        M = np.array([10.0, 10.0, 0.0])
+        heat = np.array([1.0, 1.0, 1.0])
+        mass = np.array([0.0, 1.0, 1.0])
+        dose = np.array([1.0, 1.0, 1.0])
+        self.assertNaN(metrics.bathke1(M, heat, mass, dose),
+                       [True, False, True])
+        self.assertNaN(metrics.bathke2(M, heat, heat, mass, dose),
+                       [True, False, True])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+"""
+Tests of the compiled nuclear data of nucleardata.py. Run with:
+
+    python -m unittest test_nucleardata
+"""
+
+from __future__ import division, print_function
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import nucleardata
+
+modules = ["nucleardata", "isotope", "material", "cycle", "fileIO", "cache",
+           "eranos", "metrics", "snapshot", "vision", "progress"]
+
+
+class CompileTest(unittest.TestCase):
+    """The archive is only compiled once the data is used"""
+
+    def setUp(self):
+        # A copy of the sources without the compiled archive
+        self.directory = tempfile.mkdtemp()
+        source = os.path.dirname(os.path.abspath(nucleardata.__file__))
+        for name in modules + ["parameters"]:
+            shutil.copy(os.path.join(source, name + ".py"), self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def runPython(self, code):
+        subprocess.check_call([sys.executable, "-B", "-c", code],
+                              cwd=self.directory)
+
+    def test_import(self):
+        before = sorted(os.listdir(self.directory))
+        self.runPython("import " + ", ".join(modules))
+        self.assertEqual(sorted(os.listdir(self.directory)), before)
+
+        self.runPython("import isotope; isotope.Isotope('U235')")
+        self.assertTrue(nucleardata.isCurrent(
+                os.path.join(self.directory, "parameters.npz"),
+                os.path.join(self.directory, "parameters.py")))
+
+    def test_unwritable(self):
+        # The arrays are compiled in memory if the archive cannot be
+        # written
+        filename = os.path.join(self.directory, "missing", "parameters.npz")
+        arrays = nucleardata.loadArrays(filename, nucleardata.sourceFile)
+        self.assertEqual(int(arrays["version"]), nucleardata.dataVersion)
+        self.assertFalse(os.path.exists(os.path.dirname(filename)))
+
+
+if __name__ == "__main__":
+    unittest.main()
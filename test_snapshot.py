@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+"""
+Tests of the snapshots of snapshot.py. Run with:
+
+    python -m unittest test_snapshot
+"""
+
+from __future__ import division, print_function
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+import metrics
+import snapshot
+from test_eranos import ExpectedData, loadData, smallOutput
+
+
+class SnapshotTest(ExpectedData, unittest.TestCase):
+    """A snapshot gives back the data it was saved from"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "small.npz")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def roundTrip(self, **kwargs):
+        data = loadData(smallOutput, **kwargs)
+        snapshot.saveSnapshot(self.filename, data)
+        return data, snapshot.loadSnapshot(self.filename)
+
+    def test_round_trip(self):
+        data, loaded = self.roundTrip()
+        self.assertCycles(loaded[0])
+        self.assertStreams(loaded[1:])
+        for cycle, original in zip(loaded[0], data[0]):
+            for key, material in original.materials.items():
+                self.assertEqual(
+                    sorted((name, iso.mass) for name, iso
+                           in cycle.materials[key].isotopes.items()),
+                    sorted((name, iso.mass) for name, iso
+                           in material.isotopes.items()))
+
+    def test_lazy_round_trip(self):
+        data, loaded = self.roundTrip(lazy=True)
+        self.assertCycles(loaded[0])
+        self.assertStreams(loaded[1:])
+
+    def test_metrics(self):
+        data, loaded = self.roundTrip()
+        keys, materials = metrics.cycleMaterials(data[0])
+        loadedKeys, loadedMaterials = metrics.cycleMaterials(loaded[0])
+        self.assertEqual(loadedKeys, keys)
+        expected = metrics.proliferationMetrics(materials)
+        values = metrics.proliferationMetrics(loadedMaterials)
+        self.assertEqual(list(values), list(expected))
+        for name in expected:
+            np.testing.assert_array_equal(values[name], expected[name])
+
+    def test_mapped_arrays(self):
+        self.roundTrip()
+        arrays = snapshot.mapArchive(self.filename)
+        for name in ["mass", "present", "nuclides", "materialCycle",
+                     "cycleN", "volume"]:
+            self.assertTrue(isinstance(arrays[name], np.memmap), name)
+        # Scalars are read into memory
+        self.assertFalse(isinstance(arrays["version"], np.memmap))
+        self.assertEqual(int(arrays["version"]), snapshot.snapshotVersion)
+
+        with np.load(self.filename) as archive:
+            self.assertEqual(sorted(archive.files), sorted(arrays))
+            for name in archive.files:
+                np.testing.assert_array_equal(arrays[name], archive[name])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+"""
+Tests of the VISION input written by vision.py. Run with:
+
+    python -m unittest test_vision
+"""
+
+from __future__ import division, print_function
+import os
+import shutil
+import tempfile
+import unittest
+
+import vision
+from material import Material
+from test_eranos import loadData, smallOutput
+
+isoprocess = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          "isoprocess.txt")
+
+
+class GroupingTest(unittest.TestCase):
+    """Grouped masses are the weighted sums of isoprocess.txt"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.grouping = vision.Grouping(isoprocess)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def material(self):
+        material = Material()
+        for name, mass in [("Pu242", 2.0), ("Am242", 3.0), ("U235", 5.0),
+                           ("Ce144", 7.0), ("Pr144", 11.0), ("Pr144m", 13.0),
+                           ("Cs137", 17.0)]:
+            material.addMass(name, mass)
+        return material
+
+    def assertGroups(self, masses):
+        groups = dict(zip(self.grouping.names, masses))
+        self.assertEqual(len(masses), 81)
+        # ISOTOPE026 2 pu242 am242 with WEIGHTS026 1 0.173
+        self.assertAlmostEqual(groups["pu242"], 2.0 + 0.173*3.0)
+        self.assertEqual(groups["u235"], 5.0)
+        # ISOTOPE058 3 ce144 pr144 pr144m with WEIGHTS058 1 0.985 0.015
+        self.assertAlmostEqual(groups["ce144"], 7.0 + 0.985*11.0 +
+                               0.015*13.0)
+        # ISOTOPE056 2 cs137 ba137m csba137, named after its last word
+        self.assertEqual(groups["csba137"], 17.0)
+        self.assertEqual(groups["pu239"], 0.0)
+
+    def test_masses(self):
+        self.assertGroups(self.grouping.masses(self.material()))
+
+    def test_compact_masses(self):
+        material = self.material()
+        material.compact()
+        self.assertGroups(self.grouping.masses(material))
+
+    def test_equations(self):
+        self.assertTrue("pu242 = pu242 + 0.173 * am242" in
+                        self.grouping.equations)
+
+    def test_weights_mismatch(self):
+        filename = os.path.join(self.directory, "isoprocess.txt")
+        with open(filename, "w") as f:
+            f.write("NOISOTOPES 2\n\n"
+                    "ISOTOPE001 1 u235\n"
+                    "ISOTOPE002 2 pu242 am242\n"
+                    "WEIGHTS002 1 0.173 0.5 /\n")
+        try:
+            vision.Grouping(filename)
+        except ValueError as e:
+            self.assertTrue("WEIGHTS002 of pu242" in str(e))
+        else:
+            self.fail("ValueError not raised")
+
+
+class BatchTest(unittest.TestCase):
+    """writeBatch writes the files writeInput writes one at a time"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self, filename):
+        with open(filename) as f:
+            return f.read()
+
+    def test_write_batch(self):
+        data = loadData(smallOutput)
+        jobs = (vision.streamJobs(self.directory) +
+                vision.cycleJobs(data[0], self.directory, nodes=[1, 5]))
+        self.assertEqual(len(jobs), 3 + 2*2*10)
+        summary = os.path.join(self.directory, "summary.txt")
+        files = vision.writeBatch(jobs, data, summary, isoprocess, threads=3)
+        self.assertEqual(files, [job[0] for job in jobs])
+
+        single = os.path.join(self.directory, "single.txt")
+        singleSummary = os.path.join(self.directory, "single_summary.txt")
+        for filename, charge, discharge in jobs:
+            vision.writeInput(single, vision.findMaterial(data, charge),
+                              vision.findMaterial(data, discharge),
+                              singleSummary, isoprocess)
+            self.assertEqual(self.read(filename), self.read(single))
+        self.assertEqual(self.read(summary), self.read(singleSummary))
+
+
+if __name__ == "__main__":
+    unittest.main()
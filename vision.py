@@ -1,12 +1,22 @@
 #!/usr/bin/env python
 
 """
-Vision processing.
+Vision processing. writeInput writes the VISION input of one charge and
+discharge pair; writeBatch writes any number of them at once. Run this
+module to write the VISION input of every stream combination and of
+every material and time node of each cycle of an ERANOS output:
+
+    python vision.py ERANOS_OUTPUT [DIRECTORY]
 """
 
 from __future__ import division, print_function
+import os
+import sys
+from multiprocessing.pool import ThreadPool
 
-from fileIO import fileReSeek
+from fileIO import PatternScanner
+from material import IsotopeArray
+from eranos import streamNames
 
 fissionProducts = ['H3','Co72','Co73','Co74','Co75','Ni72','Ni73','Ni74','Ni75',
                    'Ni76','Ni77','Ni78','Cu72','Cu73','Cu74','Cu75','Cu76',
@@ -142,90 +152,311 @@ lanthanides = ['La138','La139','La140','La141','La142','La143','La144','La145',
                'Gd164','Gd165','Tb159','Tb160','Tb161','Tb162','Tb162M','Tb163',
                'Tb163M','Tb164','Tb165','Dy160','Dy161','Dy162','Dy163','Dy164',
                'Dy165','Dy165M','Dy166','Ho165','Ho166','Er166','Er167','Er167M']
-             
-def writeInput(filename, charge, discharge):
+
+# Lines of isoprocess.txt defining the grouped isotopes
+isoprocessScanner = PatternScanner([
+        ("NOISOTOPES", b"NOISOTOPES", "^NOISOTOPES\s+(\d+).*"),
+        ("ISOTOPE", b"ISOTOPE", "^ISOTOPE(\d{3})\s(\d+)\s(.*)"),
+        ("WEIGHTS", b"WEIGHTS", "^WEIGHTS(\d{3})(.*)/.*")])
+
+class Grouping(object):
+    """
+    Grouping of nuclides into VISION isotopes compiled from an
+    isoprocess.txt file. The weights of the nuclides in each group are
+    stored as a sparse matrix (groups x nuclides) of (row, column,
+    weight) entries, so the grouped masses of a material are one
+    product with its vector of nuclide masses. A WEIGHTSnnn line must
+    give one weight for each isotope counted on its ISOTOPEnnn line,
+    otherwise ValueError is raised.
+
+    Attributes:
+      filename = path of the isoprocess.txt file
+      names = name of each group written to VISION input
+      equations = summary equations of the groups of 2 to 49 isotopes
+      nuclides = upper case names of the nuclides in any group
+      missing = number of the first ISOTOPEnnn line not found, or None
+
+    Methods:
+      vector(material) = array of the mass of each nuclide in a material
+      masses(material) = array of the mass of each group in a material
+    """
+
+    def __init__(self, filename="isoprocess.txt"):
+        import numpy as np
+
+        self.filename = filename
+        self.names = []
+        self.equations = []
+        self.nuclides = []
+        self.missing = None
+        columns = {}
+        rows = []
+        entries = []
+        weightsOf = []
+
+        # Find all the NOISOTOPES, ISOTOPEnnn and WEIGHTSnnn lines at once
+        lines = {"NOISOTOPES": [], "ISOTOPE": {}, "WEIGHTS": {}}
+        for id, match, offset in isoprocessScanner.scanFile(filename):
+            if id == "NOISOTOPES":
+                lines[id].append(match)
+            else:
+                number = int(match.groups()[0])
+                lines[id].setdefault(number, []).append((offset, match))
+        n_total = eval(lines["NOISOTOPES"][0].groups()[0])
+
+        for i in range(1,n_total+1):
+            # Read isotopes
+            if i not in lines["ISOTOPE"]:
+                self.missing = i
+                break
+            offset, m = lines["ISOTOPE"][i][0]
+            n_isotopes = eval(m.groups()[1])
+            isotopes = m.groups()[2].split()
+
+            # Determine name for grouped isotope
+            if len(isotopes) > n_isotopes:
+                name = isotopes[-1]
+            else:
+                name = isotopes[0]
+
+            # Special treatment for FPs and Lanthanides
+            if isotopes[0] == "FP":
+                isotopes = fissionProducts
+            elif isotopes[0] == "LA":
+                isotopes = lanthanides
+
+            # Determine weighting coefficients from the first WEIGHTSnnn
+            # line after the ISOTOPEnnn line
+            m = None
+            for weightOffset, match in lines["WEIGHTS"].get(i, []):
+                if weightOffset > offset:
+                    m = match
+                    break
+            if m:
+                weights = [eval(j) for j in m.groups()[1].split()]
+                if len(weights) != n_isotopes:
+                    raise ValueError(
+                        "WEIGHTS{0:03} of {1} in {2} has {3} weights for "
+                        "{4} isotopes".format(i, name, filename,
+                                              len(weights), n_isotopes))
+            else:
+                weights = [1 for isotope in isotopes]
+
+            # Summary equation
+            if n_isotopes >= 2 and n_isotopes < 50:
+                equation = name + " = "
+                for index in range(n_isotopes):
+                    if index != 0:
+                        equation += " + "
+                    if weights[index] != 1:
+                        equation += "{0!s} * ".format(weights[index])
+                    equation += isotopes[index]
+                self.equations.append(equation)
+
+            # Weight of each isotope, in the order their masses are summed
+            if isotopes:
+                for isotope, weight in zip(isotopes, weights):
+                    key = isotope.upper()
+                    if key not in columns:
+                        columns[key] = len(self.nuclides)
+                        self.nuclides.append(key)
+                    rows.append(len(self.names))
+                    entries.append(columns[key])
+                    weightsOf.append(weight)
+                self.names.append(name)
+
+        self._rows = np.array(rows, dtype=int)
+        self._columns = np.array(entries, dtype=int)
+        self._weights = np.array(weightsOf, dtype=float)
+
+    def vector(self, material):
+        """
+        Return an array with the mass of each nuclide of the grouping in
+        'material', matching names regardless of case as Material.find
+        """
+
+        import numpy as np
+
+        isotopes = material.isotopes
+        if isinstance(isotopes, IsotopeArray):
+            found = [isotopes.find(name) for name in self.nuclides]
+        else:
+            keys = {}
+            for key in isotopes:
+                keys.setdefault(key.upper(), key)
+            found = [isotopes[keys[name]] if name in keys else None
+                     for name in self.nuclides]
+        return np.array([0.0 if iso is None else iso.mass for iso in found])
+
+    def masses(self, material):
+        """Return an array with the mass of each group in 'material'"""
+
+        import numpy as np
+
+        vector = self.vector(material)
+        return np.bincount(self._rows, self._weights * vector[self._columns],
+                           len(self.names))
+
+# Compiled groupings of the form {path: (modification time, Grouping)}
+_groupings = {}
+
+def loadGrouping(filename="isoprocess.txt"):
+    """
+    Return the Grouping of the isoprocess file 'filename', compiled
+    again only when the file has been modified since it was last used.
+    """
+
+    path = os.path.abspath(filename)
+    mtime = os.path.getmtime(path)
+    entry = _groupings.get(path)
+    if entry is None or entry[0] != mtime:
+        entry = _groupings[path] = (mtime, Grouping(filename))
+    return entry[1]
+
+def writeInput(filename, charge, discharge, summary="summary.txt",
+               isoprocess="isoprocess.txt"):
     """
     Formats data from a charge Material and a discharge Material into a form
     suitable for VISION input. Two files are written out:
 
-    vision.txt  -- list of isotopes for VISION
-    summary.txt -- summary of equations for calculating total mass
+    filename -- list of isotopes for VISION
+    summary  -- summary of equations for calculating total mass, unless
+                summary is None
 
     The equations for total masses are based on the list of isotopes in
-    isoprocess.txt.
+    isoprocess, which is compiled once into a Grouping.
     """
-    
-    #extrapath = "Rebuscode/postprocess/"
+
+    grouping = loadGrouping(isoprocess)
+    writeVision(filename, grouping.names, grouping.masses(charge),
+                grouping.masses(discharge))
+    if summary is not None:
+        writeSummary(summary, grouping)
+
+    if grouping.missing is not None:
+        print("ISOTOPE{0} not found!".format(grouping.missing))
+        return 1
+
+def writeVision(filename, names, chargeMasses, dischargeMasses):
+    """Write the grouped charge and discharge masses to 'filename'"""
 
     visionFile = open(filename,"w")
     visionFile.write("ISOTOPE     CHARGE      DISCHARGE\n")
-    summaryFile = open("summary.txt","w")
-
-    # Open Output/summary.txt
-    
-    isoFile = open("isoprocess.txt", "r")
-    m = fileReSeek(isoFile, "^NOISOTOPES\s+(\d+).*")
-    n_total = eval(m.groups()[0])
-
-    for i in range(1,n_total+1):
-        isoFile.seek(0)
-
-        # Read isotopes
-        m = fileReSeek(isoFile, "^ISOTOPE{0:03}\s(\d+)\s(.*)".format(i))
-        if not m:
-            print("ISOTOPE{0} not found!".format(i))
-            return 1
-        n_isotopes = eval(m.groups()[0])
-        isotopes = m.groups()[1].split()
-
-        # Determine name for grouped isotope
-        if len(isotopes) > n_isotopes:
-            name = isotopes[-1]
-        else:
-            name = isotopes[0]
-
-        # Special treatment for FPs and Lanthanides
-        if isotopes[0] == "FP":
-            isotopes = fissionProducts
-        elif isotopes[0] == "LA":
-            isotopes = lanthanides
-
-        # Determine weighting coefficients
-        m = fileReSeek(isoFile, "^WEIGHTS{0:03}(.*)/.*".format(i))
-        if m:
-            weights = [eval(j) for j in m.groups()[0].split()]
-        else:
-            weights = [1 for isotope in isotopes]
-
-        # Print summary information
-        if n_isotopes >= 2 and n_isotopes < 50:
-            equation = name + " = "
-            for index in range(n_isotopes):
-                if index != 0:
-                    equation += " + "
-                if weights[index] != 1:
-                    equation += "{0!s} * ".format(weights[index])
-                equation += isotopes[index]
-            summaryFile.write(equation + "\n")
-
-        # Calculate charge and discharge masses
-        chargeMass = 0.0
-        dischargeMass = 0.0
-        for index, isotope in enumerate(isotopes):
-            # If isotope is in charge material, add its mass
-            iso = charge.find(isotope)
-            if iso:
-                chargeMass += iso.mass*weights[index]
-            # If isotope is in discharge material, add its mass
-            iso = discharge.find(isotope)
-            if iso:
-                dischargeMass += iso.mass*weights[index]
-
-        # Write masses to visionFile
-        if isotopes:
-            visionFile.write("{0:12}{1:<12.4E}{2:<12.4E}\n".format(
-                    name, chargeMass, dischargeMass))
-
-    isoFile.close()
+    for name, chargeMass, dischargeMass in zip(names, chargeMasses,
+                                               dischargeMasses):
+        visionFile.write("{0:12}{1:<12.4E}{2:<12.4E}\n".format(
+                name, chargeMass, dischargeMass))
     visionFile.close()
+
+def writeSummary(filename, grouping):
+    """Write the summary equations of a Grouping to 'filename'"""
+
+    summaryFile = open(filename,"w")
+    for equation in grouping.equations:
+        summaryFile.write(equation + "\n")
     summaryFile.close()
+
+def writeBatch(jobs, data=None, summary="summary.txt",
+               isoprocess="isoprocess.txt", threads=4):
+    """
+    Write VISION input for every job in 'jobs', a list of (filename,
+    charge, discharge). The charge and discharge are Material instances
+    or, looked up in 'data' as returned by eranos.loadData, a stream name
+    of eranos.streamNames or a key (cycle index, (timenode, material))
+    as returned by metrics.cycleMaterials.
+
+    The grouping of isoprocess is compiled once and the summary
+    equations are written once to 'summary', unless it is None. The
+    grouped masses are computed in turn and the files written by a pool
+    of 'threads' threads. Returns the list of files written.
+    """
+
+    grouping = loadGrouping(isoprocess)
+
+    # Materials are read and expanded here, since lazily loaded ones are
+    # not safe to use from several threads
+    masses = {}
+    tasks = []
+    for filename, charge, discharge in jobs:
+        columns = []
+        for spec in [charge, discharge]:
+            key = spec if isinstance(spec, (str, tuple)) else id(spec)
+            if key not in masses:
+                masses[key] = grouping.masses(findMaterial(data, spec))
+            columns.append(masses[key])
+        tasks.append((filename, grouping.names) + tuple(columns))
+
+    if summary is not None:
+        writeSummary(summary, grouping)
+    pool = ThreadPool(threads)
+    try:
+        pool.map(_writeTask, tasks)
+    finally:
+        pool.close()
+        pool.join()
+
+    if grouping.missing is not None:
+        print("ISOTOPE{0} not found!".format(grouping.missing))
+    return [task[0] for task in tasks]
+
+def _writeTask(task):
+    writeVision(*task)
+
+def findMaterial(data, spec):
+    """
+    Return the Material given by 'spec' for writeBatch: a Material, a
+    stream name of eranos.streamNames or a key (cycle index, (timenode,
+    material)) of the data returned by eranos.loadData.
+    """
+
+    if isinstance(spec, str):
+        return data[1 + streamNames.index(spec)]
+    if isinstance(spec, tuple):
+        i, key = spec
+        return data[0][i].materials[key]
+    return spec
+
+def streamJobs(directory="."):
+    """
+    Return the writeBatch jobs of the stream combinations written from
+    EPT: vision1.txt for the single stream, and vision2a.txt and
+    vision2b.txt for the two streams, in 'directory'.
+    """
+
+    return [(os.path.join(directory, filename), charge, discharge)
+            for filename, charge, discharge in [
+            ("vision1.txt", "ONESTREAMCH", "ONESTREAMDIS"),
+            ("vision2a.txt", "CHARGE", "DISCHARGE"),
+            ("vision2b.txt", "CHBLANK", "DISBLANK")]]
+
+def cycleJobs(cycles, directory=".", nodes=None):
+    """
+    Return writeBatch jobs for every material of every cycle in 'cycles'
+    at each time node in 'nodes', by default every node after the
+    first. Each file, vision_c<cycle>_n<node>_<material>.txt in
+    'directory', has the material at the first node of the cycle as
+    charge and at the given node as discharge.
+    """
+
+    jobs = []
+    for i, cycle in enumerate(cycles):
+        keys = sorted(cycle.materials)
+        first = keys[0][0] if keys else 0
+        for node, name in keys:
+            if (nodes is None and node == first) or \
+                    (nodes is not None and node not in nodes):
+                continue
+            filename = "vision_c{0}_n{1}_{2}.txt".format(cycle.n, node, name)
+            jobs.append((os.path.join(directory, filename),
+                         (i, (first, name)), (i, (node, name))))
+    return jobs
+
+
+if __name__ == "__main__":
+    # python vision.py ERANOS_OUTPUT [DIRECTORY]
+    import eranos
+    directory = sys.argv[2] if len(sys.argv) > 2 else "."
+    data = eranos.loadData(sys.argv[1], gui=False)
+    files = writeBatch(streamJobs(directory) + cycleJobs(data[0], directory),
+                       data, os.path.join(directory, "summary.txt"))
+    print("Wrote {0} files to {1}".format(len(files), directory))